@@ -1,19 +1,36 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import os
 import sqlite3
 import json
+import re
 import datetime
 import uuid
-import random
-from functools import lru_cache
+import shutil
+import html
+import math
+import hashlib
+import time
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Import functions from pdf_processor_fixed
 from pdf_processor_fixed import (
-    connect_db as get_db_connection, 
+    read_connection,
+    write_connection,
     extract_text_from_pdf, 
-    extract_structured_data_from_text, 
+    extract_structured_data_with_source,
+    load_cached_extraction,
+    save_cached_extraction,
+    normalize_field,
+    bulk_insert,
+    SQLITE_MAX_VARIABLES,
+    read_secrets,
+    initialize_aws_clients,
     add_sample_data, 
     create_tables
 )
@@ -21,15 +38,25 @@ from pdf_processor_fixed import (
 # --- Configuration & Setup ---
 st.set_page_config(layout="wide", page_title="Dealer Nudging System")
 
+# Paths resolved once at import rather than on every call
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOADS_DIR = os.path.join(BASE_DIR, "uploads")
+SECRETS_PATH = os.path.join(BASE_DIR, "secrets.json")
+# Model-extracted structured data from earlier uploads, one JSON file per PDF digest
+EXTRACTION_CACHE_DIR = os.path.join(BASE_DIR, "extraction_cache")
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+os.makedirs(EXTRACTION_CACHE_DIR, exist_ok=True)
+
+# Shared generator for simulated IMEI numbers
+rng = np.random.default_rng()
+
 # --- Global State & Session Management ---
 if "page" not in st.session_state:
     st.session_state.page = "dashboard"
 if "current_scheme" not in st.session_state:
     st.session_state.current_scheme = None
-if "uploaded_pdf" not in st.session_state:
-    st.session_state.uploaded_pdf = None
-if "extracted_text" not in st.session_state:
-    st.session_state.extracted_text = None
+if "uploaded_pdf_bytes" not in st.session_state:
+    st.session_state.uploaded_pdf_bytes = None
 if "structured_data" not in st.session_state:
     st.session_state.structured_data = None
 if "simulation_results" not in st.session_state:
@@ -41,16 +68,26 @@ if "show_simulation_results" not in st.session_state:
 def navigate_to(page_name):
     """Navigate to a different page in the application"""
     st.session_state.page = page_name
-    st.rerun()
 
-@lru_cache(maxsize=128)
+def escape_html(value):
+    """Escape a value for interpolation into an HTML card"""
+    return html.escape(str(value))
+
+def card_html(title, fields, free_item=None, extra_html=""):
+    """Build the HTML for one card from a title and label-to-value fields"""
+    rows = "".join(f"<p><b>{escape_html(label)}:</b> {escape_html(value)}</p>" for label, value in fields.items())
+    free_item_html = f"<div class='free-item-highlight'>🎁 FREE: {escape_html(free_item)}</div>" if free_item else ""
+    return f"<div class='card'><h3>{escape_html(title)}</h3>{rows}{free_item_html}{extra_html}</div>"
+
+def open_scheme_details(scheme_id):
+    """Navigate to the details page of a scheme"""
+    st.session_state.current_scheme = scheme_id
+    navigate_to("scheme_details")
+
 def load_secrets():
-    """Load secrets from secrets.json"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    secrets_path = os.path.join(current_dir, "secrets.json")
+    """Load secrets from secrets.json, re-reading it only when the file changes"""
     try:
-        with open(secrets_path, "r") as f:
-            return json.load(f)
+        return read_secrets(SECRETS_PATH)
     except FileNotFoundError:
         st.error("secrets.json not found. Please ensure the file exists.")
         return {}
@@ -60,189 +97,389 @@ def load_secrets():
 
 def save_uploaded_pdf(uploaded_file):
     """Save uploaded PDF to the uploads directory"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    uploads_dir = os.path.join(current_dir, "uploads")
-    os.makedirs(uploads_dir, exist_ok=True)
-    
     # Generate a unique filename to avoid overwrites
     unique_filename = f"{uuid.uuid4().hex[:8]}_{uploaded_file.name}"
-    pdf_path = os.path.join(uploads_dir, unique_filename)
+    pdf_path = os.path.join(UPLOADS_DIR, unique_filename)
     
+    # Stream in fixed-size chunks rather than copying the whole upload at once
+    uploaded_file.seek(0)
     with open(pdf_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+        shutil.copyfileobj(uploaded_file, f, length=65536)
     return pdf_path
 
+# --- PDF Extraction ---
+# Scheme circulars rarely run past a few pages; anything beyond this is ignored
+MAX_EXTRACT_PAGES = 20
+# Pages shown in the extracted text view before "Show More Pages"
+PREVIEW_PAGES = 3
+
+# Keyed on the file bytes so reruns from widget edits on the upload page
+# reuse the previous extraction instead of parsing the PDF again
+@st.cache_data(show_spinner=False)
+def extract_pdf_text(pdf_bytes):
+    """Extract (page number, text) pairs from PDF bytes"""
+    return extract_text_from_pdf(pdf_bytes, show_progress=False, max_pages=MAX_EXTRACT_PAGES)
+
+def load_cached_scheme_data(pdf_sha256):
+    """Load structured data saved for a PDF by an earlier extraction, if any and still current"""
+    return load_cached_extraction(os.path.join(EXTRACTION_CACHE_DIR, f"{pdf_sha256}.json"))
+
+def save_cached_scheme_data(pdf_sha256, structured_data, source):
+    """Save model-produced structured data for a PDF; rule-based placeholders are not kept"""
+    save_cached_extraction(os.path.join(EXTRACTION_CACHE_DIR, f"{pdf_sha256}.json"), structured_data, source)
+
+# Runs on the extraction pool, which has no ScriptRunContext, so it calls no
+# Streamlit APIs and none of the st.cache_data wrappers
+def extract_scheme_data(pdf_sha256, document_name, pdf_bytes, bedrock_client=None, textract_client=None,
+                        inference_profile_arn=None):
+    """Extract structured scheme data from PDF bytes, reusing earlier results for the same file"""
+    structured_data = load_cached_scheme_data(pdf_sha256)
+    if structured_data is not None:
+        return structured_data
+    
+    # Page text stays local; the page view re-reads it from extract_pdf_text
+    extracted_text = extract_text_from_pdf(
+        pdf_bytes, textract_client, show_progress=False, max_pages=MAX_EXTRACT_PAGES
+    )
+    full_text = "\n\n".join(page[1] for page in extracted_text)
+    # Only Bedrock results are written to the disk cache; without a client this
+    # falls back to the rule-based placeholders, which are extracted afresh
+    structured_data, source = extract_structured_data_with_source(
+        full_text, document_name, bedrock_client, inference_profile_arn
+    )
+    if structured_data:
+        save_cached_scheme_data(pdf_sha256, structured_data, source)
+    return structured_data
+
+# Finished extractions kept for reuse when the same PDF is uploaded again
+EXTRACTION_JOBS_KEPT = 32
+
+@st.cache_resource
+def get_extraction_jobs():
+    """Get the worker pool and the extraction futures shared by all sessions, keyed by PDF digest"""
+    return {"executor": ThreadPoolExecutor(max_workers=2), "lock": threading.Lock(), "futures": OrderedDict()}
+
+def submit_scheme_extraction(pdf_sha256, document_name, pdf_bytes):
+    """Start extracting a PDF, or join the extraction already running or done for the same file"""
+    # Secrets and clients are resolved here on the script thread, as process_pdf does
+    # for the command-line path; the clients are cached per credential set
+    secrets = load_secrets()
+    bedrock_client, textract_client = initialize_aws_clients(secrets)
+    jobs = get_extraction_jobs()
+    with jobs["lock"]:
+        futures = jobs["futures"]
+        future = futures.get(pdf_sha256)
+        # Failed or empty extractions are retried rather than shared
+        if future is None or (future.done() and (future.exception() or not future.result())):
+            future = jobs["executor"].submit(
+                extract_scheme_data, pdf_sha256, document_name, pdf_bytes,
+                bedrock_client, textract_client, secrets.get("INFERENCE_PROFILE_CLAUDE")
+            )
+            futures[pdf_sha256] = future
+        futures.move_to_end(pdf_sha256)
+        while len(futures) > EXTRACTION_JOBS_KEPT:
+            futures.popitem(last=False)
+    return future
+
+# Seconds between reruns of the extraction status fragment while the worker runs
+EXTRACTION_POLL_INTERVAL = 0.2
+
+@st.fragment(run_every=EXTRACTION_POLL_INTERVAL)
+def show_extraction_status(job):
+    """Show extraction progress, rerunning only this fragment until the worker finishes"""
+    if job["future"].done():
+        # Rerun the whole page so the review form is built from the result
+        st.rerun()
+    elapsed = time.monotonic() - job["started_at"]
+    st.status(f"Extracting scheme data from PDF... ({elapsed:.0f}s)", state="running")
+
+# --- SQL Statements ---
+# Hoisted to module constants so every call reuses the same text and hits the
+# connection's prepared-statement cache
+SQL_ACTIVE_SCHEMES = """
+SELECT * FROM schemes 
+WHERE deal_status = ? AND approval_status = ? 
+ORDER BY scheme_period_end DESC
+LIMIT 2
+"""
+
+SQL_ALL_PRODUCTS = "SELECT * FROM products WHERE is_active = 1 ORDER BY product_name"
+
+SQL_ALL_DEALERS = "SELECT * FROM dealers WHERE is_active = 1 ORDER BY dealer_name"
+
+SQL_ALL_SCHEME_PRODUCTS = """
+SELECT sp.scheme_id, p.*, sp.support_type, sp.payout_type, sp.payout_amount, 
+       sp.payout_unit, sp.dealer_contribution, sp.total_payout,
+       sp.is_bundle_offer, sp.bundle_price, sp.is_upgrade_offer,
+       sp.free_item_description
+FROM products p
+JOIN scheme_products sp ON p.product_id = sp.product_id
+WHERE p.is_active = 1
+ORDER BY sp.scheme_id, sp.id
+"""
+
+SQL_SCHEME_DETAILS = "SELECT * FROM schemes WHERE scheme_id = ?"
+
+SQL_SCHEME_RULES = "SELECT * FROM scheme_rules WHERE scheme_id = ?"
+
+SQL_PAYOUT_SLABS = "SELECT * FROM payout_slabs WHERE scheme_product_id = ?"
+
+SQL_SCHEME_BUNDLE = """
+SELECT s.*,
+       sp.id AS scheme_product_id, p.product_id, p.product_name, p.product_code,
+       p.product_category, sp.support_type, sp.payout_type, sp.payout_amount,
+       sp.payout_unit, sp.dealer_contribution, sp.total_payout,
+       sp.is_bundle_offer, sp.bundle_price, sp.is_upgrade_offer,
+       sp.free_item_description,
+       ps.slab_id, ps.min_quantity, ps.max_quantity,
+       ps.payout_amount AS slab_payout_amount, ps.total_payout AS slab_total_payout
+FROM schemes s
+LEFT JOIN scheme_products sp ON sp.scheme_id = s.scheme_id
+LEFT JOIN products p ON p.product_id = sp.product_id AND p.is_active = 1
+LEFT JOIN payout_slabs ps ON ps.scheme_product_id = sp.id
+WHERE s.scheme_id = ?
+ORDER BY sp.id, ps.min_quantity
+"""
+
+SQL_PENDING_APPROVALS = """
+SELECT * FROM schemes 
+WHERE approval_status = ? 
+ORDER BY upload_timestamp DESC, scheme_id DESC
+LIMIT ? OFFSET ?
+"""
+
+SQL_COUNT_APPROVALS = "SELECT COUNT(*) FROM schemes WHERE approval_status = ?"
+
+SQL_SALES_DATA = """
+SELECT 
+    st.sale_id, 
+    st.sale_timestamp, 
+    d.dealer_name, 
+    d.region, 
+    p.product_name, 
+    p.product_category, 
+    s.scheme_name, 
+    st.quantity_sold, 
+    st.dealer_price_dp, 
+    st.earned_dealer_incentive_amount, 
+    st.verification_status
+FROM sales_transactions st
+JOIN dealers d ON st.dealer_id = d.dealer_id
+JOIN products p ON st.product_id = p.product_id
+JOIN schemes s ON st.scheme_id = s.scheme_id
+WHERE st.sale_timestamp BETWEEN ? AND ?
+ORDER BY st.sale_timestamp DESC
+"""
+
+SQL_HAS_SALES = "SELECT EXISTS(SELECT 1 FROM sales_transactions)"
+
+# Sales summed per category, region, scheme and day; every dashboard chart is a
+# roll-up of this one result
+SQL_SALES_SUMMARY = """
+SELECT 
+    p.product_category, 
+    d.region, 
+    s.scheme_name, 
+    date(st.sale_timestamp) AS sale_date, 
+    SUM(st.quantity_sold) AS quantity_sold, 
+    SUM(st.earned_dealer_incentive_amount) AS earned_dealer_incentive_amount
+FROM sales_transactions st
+JOIN dealers d ON st.dealer_id = d.dealer_id
+JOIN products p ON st.product_id = p.product_id
+JOIN schemes s ON st.scheme_id = s.scheme_id
+WHERE st.sale_timestamp BETWEEN ? AND ?
+GROUP BY p.product_category, d.region, s.scheme_name, date(st.sale_timestamp)
+"""
+
+# Formats sale timestamps are stored in and date() returns them as, so pandas
+# can parse them without guessing
+SALE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+SALE_DATE_FORMAT = "%Y-%m-%d"
+
+# Pending schemes listed per approvals page
+APPROVALS_PER_PAGE = 50
+
 # --- Database Interaction Functions ---
-@lru_cache(maxsize=32)
+@st.cache_data(ttl=60, show_spinner=False)
 def get_active_schemes():
     """Get all active and approved schemes from the database"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-            SELECT * FROM schemes 
-            WHERE deal_status = ? AND approval_status = ? 
-            ORDER BY scheme_period_end DESC
-            LIMIT 2
-            """, (
-                "Active", "Approved"
-            ))
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_ACTIVE_SCHEMES, ("Active", "Approved"))
+        return [dict(row) for row in cursor.fetchall()]
 
-@lru_cache(maxsize=32)
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_products():
     """Get all products from the database"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM products WHERE is_active = 1 ORDER BY product_name")
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_ALL_PRODUCTS)
+        return [dict(row) for row in cursor.fetchall()]
 
-@lru_cache(maxsize=32)
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_dealers():
     """Get all dealers from the database"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM dealers WHERE is_active = 1 ORDER BY dealer_name")
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_ALL_DEALERS)
+        return [dict(row) for row in cursor.fetchall()]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_scheme_products_map():
+    """Get the active products of every scheme, keyed by scheme_id"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_ALL_SCHEME_PRODUCTS)
+        products_by_scheme = {}
+        for row in cursor.fetchall():
+            products_by_scheme.setdefault(row["scheme_id"], []).append(dict(row))
+        return products_by_scheme
 
-@lru_cache(maxsize=128)
 def get_scheme_products(scheme_id):
     """Get products associated with a specific scheme"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-            SELECT p.*, sp.support_type, sp.payout_type, sp.payout_amount, 
-                   sp.payout_unit, sp.dealer_contribution, sp.total_payout,
-                   sp.is_bundle_offer, sp.bundle_price, sp.is_upgrade_offer,
-                   sp.free_item_description
-            FROM products p
-            JOIN scheme_products sp ON p.product_id = sp.product_id
-            WHERE sp.scheme_id = ? AND p.is_active = 1
-            """, (scheme_id,))
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
-
-@lru_cache(maxsize=128)
+    return get_scheme_products_map().get(scheme_id, [])
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_scheme_details(scheme_id):
     """Get details for a specific scheme"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM schemes WHERE scheme_id = ?", (scheme_id,))
-            return cursor.fetchone()
-        finally:
-            conn.close()
-    return None
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_SCHEME_DETAILS, (scheme_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
 
-@lru_cache(maxsize=128)
+@st.cache_data(ttl=60, show_spinner=False)
 def get_scheme_rules(scheme_id):
     """Get rules for a specific scheme"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM scheme_rules WHERE scheme_id = ?", (scheme_id,))
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_SCHEME_RULES, (scheme_id,))
+        return [dict(row) for row in cursor.fetchall()]
 
-@lru_cache(maxsize=128)
+@st.cache_data(ttl=60, show_spinner=False)
 def get_payout_slabs(scheme_product_id):
     """Get payout slabs for a specific scheme product"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM payout_slabs WHERE scheme_product_id = ?", (scheme_product_id,))
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
-
-@lru_cache(maxsize=32)
-def get_pending_approvals():
-    """Get schemes pending approval"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-            SELECT * FROM schemes 
-            WHERE approval_status = ? 
-            ORDER BY upload_timestamp DESC
-            """, (
-                "Pending",
-            ))
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_PAYOUT_SLABS, (scheme_product_id,))
+        return [dict(row) for row in cursor.fetchall()]
 
-@lru_cache(maxsize=128)
+# Columns of the scheme bundle query that belong to a scheme product or a slab
+SCHEME_BUNDLE_PRODUCT_COLUMNS = (
+    "scheme_product_id", "product_id", "product_name", "product_code", "product_category",
+    "support_type", "payout_type", "payout_amount", "payout_unit", "dealer_contribution",
+    "total_payout", "is_bundle_offer", "bundle_price", "is_upgrade_offer", "free_item_description"
+)
+SCHEME_BUNDLE_SLAB_COLUMNS = ("slab_id", "min_quantity", "max_quantity", "slab_payout_amount", "slab_total_payout")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_scheme_bundle(scheme_id):
+    """Get a scheme together with its products and their payout slabs in a single query"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_SCHEME_BUNDLE, (scheme_id,))
+        rows = cursor.fetchall()
+    
+    if not rows:
+        return None
+    
+    # Group the flat rows client-side: one scheme, its products, and each product's slabs
+    excluded = set(SCHEME_BUNDLE_PRODUCT_COLUMNS) | set(SCHEME_BUNDLE_SLAB_COLUMNS)
+    scheme = {key: rows[0][key] for key in rows[0].keys() if key not in excluded}
+    products = {}
+    for row in rows:
+        if row["product_id"] is None:
+            continue
+        product = products.get(row["scheme_product_id"])
+        if product is None:
+            product = {key: row[key] for key in SCHEME_BUNDLE_PRODUCT_COLUMNS}
+            product["slabs"] = []
+            products[row["scheme_product_id"]] = product
+        if row["slab_id"] is not None:
+            product["slabs"].append({key: row[key] for key in SCHEME_BUNDLE_SLAB_COLUMNS})
+    
+    return {"scheme": scheme, "products": list(products.values())}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_pending_approvals(page=1):
+    """Get one page of schemes pending approval"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_PENDING_APPROVALS, ("Pending", APPROVALS_PER_PAGE, (page - 1) * APPROVALS_PER_PAGE))
+        return [dict(row) for row in cursor.fetchall()]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def count_pending_approvals():
+    """Count schemes pending approval"""
+    with read_connection() as conn:
+        return conn.execute(SQL_COUNT_APPROVALS, ("Pending",)).fetchone()[0]
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_sales_data(days=30):
-    """Get sales data for the last N days"""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            end_date = datetime.datetime.now()
-            start_date = end_date - datetime.timedelta(days=days)
-            
-            query = """
-            SELECT 
-                st.sale_id, 
-                st.sale_timestamp, 
-                d.dealer_name, 
-                d.region, 
-                p.product_name, 
-                p.product_category, 
-                s.scheme_name, 
-                st.quantity_sold, 
-                st.dealer_price_dp, 
-                st.earned_dealer_incentive_amount, 
-                st.verification_status
-            FROM sales_transactions st
-            JOIN dealers d ON st.dealer_id = d.dealer_id
-            JOIN products p ON st.product_id = p.product_id
-            JOIN schemes s ON st.scheme_id = s.scheme_id
-            WHERE st.sale_timestamp BETWEEN ? AND ?
-            ORDER BY st.sale_timestamp DESC
-            """
-            cursor.execute(query, (start_date.strftime("%Y-%m-%d %H:%M:%S"), end_date.strftime("%Y-%m-%d %H:%M:%S")))
-            return cursor.fetchall()
-        finally:
-            conn.close()
-    return []
+    """Get sales data for the last N days as a DataFrame"""
+    with read_connection() as conn:
+        return pd.read_sql_query(SQL_SALES_DATA, conn, params=sales_window(days),
+                                 parse_dates={"sale_timestamp": SALE_TIMESTAMP_FORMAT})
+
+def sales_window(days):
+    """Get the (start, end) timestamp strings covering the last N days"""
+    end_date = datetime.datetime.now()
+    start_date = end_date - datetime.timedelta(days=days)
+    return start_date.strftime(SALE_TIMESTAMP_FORMAT), end_date.strftime(SALE_TIMESTAMP_FORMAT)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def has_sales():
+    """Check whether any sales have been recorded"""
+    with read_connection() as conn:
+        return bool(conn.execute(SQL_HAS_SALES).fetchone()[0])
+
+# Totals carried through every dashboard roll-up
+SALES_SUMMARY_TOTALS = {
+    'quantity_sold': 'sum',
+    'earned_dealer_incentive_amount': 'sum'
+}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_sales_summary(days=30):
+    """Get units sold and incentives per category, region, scheme and day for the last N days"""
+    with read_connection() as conn:
+        summary = pd.read_sql_query(SQL_SALES_SUMMARY, conn, params=sales_window(days),
+                                    parse_dates={"sale_date": SALE_DATE_FORMAT})
+    return summary.astype({
+        'product_category': 'category',
+        'region': 'category',
+        'scheme_name': 'category'
+    })
+
+def rollup_sales(summary, column):
+    """Roll the sales summary up to totals per value of one column"""
+    return summary.groupby(column, observed=True).agg(SALES_SUMMARY_TOTALS).reset_index()
+
+def get_product_ids(cursor, product_codes):
+    """Map (product_name, product_code) to product_id for the given product codes"""
+    product_codes = list(product_codes)
+    product_ids = {}
+    # One IN (...) per chunk, so a large scheme stays under SQLite's bound-variable limit
+    for start in range(0, len(product_codes), SQLITE_MAX_VARIABLES):
+        batch = product_codes[start:start + SQLITE_MAX_VARIABLES]
+        placeholders = ",".join("?" * len(batch))
+        cursor.execute(
+            f"SELECT product_id, product_name, product_code FROM products WHERE product_code IN ({placeholders})",
+            batch
+        )
+        product_ids.update(
+            ((row["product_name"], row["product_code"]), row["product_id"]) for row in cursor.fetchall()
+        )
+    return product_ids
 
 def add_new_scheme_from_data(structured_data, pdf_path):
     """Add a new scheme to the database from structured data"""
-    conn = get_db_connection()
-    if conn:
+    with write_connection() as conn:
         try:
             cursor = conn.cursor()
-            
-            # Normalize fields from pdf_processor_fixed
-            from pdf_processor_fixed import normalize_field
+            # Take the write lock before the product lookups so the whole save
+            # is one transaction that cannot fail half-way on SQLITE_BUSY
+            cursor.execute("BEGIN IMMEDIATE")
             
             # Add scheme
             scheme_name = normalize_field(structured_data.get("scheme_name"), str, f"Scheme from {os.path.basename(pdf_path)}")
@@ -258,6 +495,7 @@ def add_new_scheme_from_data(structured_data, pdf_path):
                 applicable_region, dealer_type_eligibility, scheme_document_name,
                 raw_extracted_text_path, deal_status, approval_status
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING scheme_id
             """, (
                 scheme_name,
                 scheme_type,
@@ -270,91 +508,108 @@ def add_new_scheme_from_data(structured_data, pdf_path):
                 "Active",
                 "Pending"
             ))
-            scheme_id = cursor.lastrowid
+            scheme_id = cursor.fetchone()[0]
             
-            # Add products
+            # Normalize products
+            products = []
             for product_data in structured_data.get("products", []):
-                product_name = normalize_field(product_data.get("product_name"), str, f"Product {uuid.uuid4().hex[:8]}")
-                product_code = normalize_field(product_data.get("product_code"), str, f"CODE-{uuid.uuid4().hex[:8]}")
-                product_category = normalize_field(product_data.get("product_category"), str, "Mobile")
-                
-                cursor.execute("SELECT product_id FROM products WHERE product_name = ? AND product_code = ?", (product_name, product_code))
-                existing_product = cursor.fetchone()
-                
-                if existing_product:
-                    product_id = existing_product["product_id"]
-                else:
-                    cursor.execute("""
-                    INSERT INTO products (product_name, product_code, product_category) 
-                    VALUES (?, ?, ?)
-                    """, (product_name, product_code, product_category))
-                    product_id = cursor.lastrowid
-                
-                # Add scheme product
-                support_type = normalize_field(product_data.get("support_type"), str, scheme_type)
-                payout_type = normalize_field(product_data.get("payout_type"), str, "Fixed")
-                payout_amount = normalize_field(product_data.get("payout_amount"), float, 1000.0)
-                payout_unit = normalize_field(product_data.get("payout_unit"), str, "INR")
-                free_item_description = normalize_field(product_data.get("free_item_description"), str)
-                
-                cursor.execute("""
-                INSERT INTO scheme_products (
-                    scheme_id, product_id, support_type, payout_type, payout_amount, 
-                    payout_unit, free_item_description
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    scheme_id, product_id, support_type, payout_type, payout_amount, 
-                    payout_unit, free_item_description
+                products.append((
+                    normalize_field(product_data.get("product_name"), str, f"Product {uuid.uuid4().hex[:8]}"),
+                    normalize_field(product_data.get("product_code"), str, f"CODE-{uuid.uuid4().hex[:8]}"),
+                    normalize_field(product_data.get("product_category"), str, "Mobile"),
+                    normalize_field(product_data.get("support_type"), str, scheme_type),
+                    normalize_field(product_data.get("payout_type"), str, "Fixed"),
+                    normalize_field(product_data.get("payout_amount"), float, 1000.0),
+                    normalize_field(product_data.get("payout_unit"), str, "INR"),
+                    normalize_field(product_data.get("free_item_description"), str)
                 ))
             
+            # Add products not already in the catalogue, then look up every id at once
+            product_codes = list({product[1] for product in products})
+            product_ids = get_product_ids(cursor, product_codes)
+            new_products = {}
+            for product_name, product_code, product_category, *_ in products:
+                if (product_name, product_code) not in product_ids:
+                    new_products.setdefault((product_name, product_code), product_category)
+            
+            if new_products:
+                bulk_insert(cursor, "products", ("product_name", "product_code", "product_category"), [
+                    (name, code, category) for (name, code), category in new_products.items()
+                ])
+                product_ids = get_product_ids(cursor, product_codes)
+            
+            # Collect scheme products
+            scheme_product_rows = [
+                (scheme_id, product_ids[(product[0], product[1])]) + product[3:]
+                for product in products
+            ]
+            
+            bulk_insert(cursor, "scheme_products", (
+                "scheme_id", "product_id", "support_type", "payout_type", "payout_amount",
+                "payout_unit", "free_item_description"
+            ), scheme_product_rows)
+            
             # Add rules
-            for rule_data in structured_data.get("scheme_rules", []):
-                rule_type = normalize_field(rule_data.get("rule_type"), str, "General")
-                rule_description = normalize_field(rule_data.get("rule_description"), str, "No description")
-                rule_value = normalize_field(rule_data.get("rule_value"), str)
-                
-                cursor.execute("""
-                INSERT INTO scheme_rules (scheme_id, rule_type, rule_description, rule_value) 
-                VALUES (?, ?, ?, ?)
-                """, (scheme_id, rule_type, rule_description, rule_value))
+            rule_rows = [
+                (
+                    scheme_id,
+                    normalize_field(rule_data.get("rule_type"), str, "General"),
+                    normalize_field(rule_data.get("rule_description"), str, "No description"),
+                    normalize_field(rule_data.get("rule_value"), str)
+                )
+                for rule_data in structured_data.get("scheme_rules", [])
+            ]
+            
+            bulk_insert(cursor, "scheme_rules", ("scheme_id", "rule_type", "rule_description", "rule_value"), rule_rows)
             
+            # Everything above runs in the transaction opened by BEGIN IMMEDIATE,
+            # so the whole save costs one commit
             conn.commit()
+            get_active_schemes.clear()
+            get_pending_approvals.clear()
+            count_pending_approvals.clear()
+            get_all_products.clear()
+            get_scheme_products_map.clear()
             return scheme_id
         except Exception as e:
             conn.rollback()
             st.error(f"Error saving scheme to database: {e}")
             return None
-        finally:
-            conn.close()
-    return None
 
 def update_scheme_status(scheme_id, status, approved_by="Admin"):
     """Update the approval status of a scheme"""
-    conn = get_db_connection()
-    if conn:
+    return update_scheme_statuses([scheme_id], status, approved_by)
+
+def update_scheme_statuses(scheme_ids, status, approved_by="Admin"):
+    """Update the approval status of several schemes in one transaction"""
+    with write_connection() as conn:
         try:
             cursor = conn.cursor()
-            cursor.execute("""
+            cursor.executemany("""
             UPDATE schemes 
             SET approval_status = ?, approved_by = ?, approval_timestamp = CURRENT_TIMESTAMP
             WHERE scheme_id = ?
-            """, (status, approved_by, scheme_id))
+            """, [(status, approved_by, scheme_id) for scheme_id in scheme_ids])
             conn.commit()
+            get_active_schemes.clear()
+            get_pending_approvals.clear()
+            count_pending_approvals.clear()
+            get_scheme_details.clear()
+            get_scheme_bundle.clear()
             return True
         except Exception as e:
+            conn.rollback()
             st.error(f"Error updating scheme status: {e}")
             return False
-        finally:
-            conn.close()
-    return False
 
 def add_simulated_sale(dealer_id, product_id, scheme_id, quantity, dealer_price, incentive):
     """Add a simulated sale to the database"""
-    conn = get_db_connection()
-    if conn:
+    with write_connection() as conn:
         try:
             cursor = conn.cursor()
-            imei = "SIM-" + ",".join(["".join([str(random.randint(0, 9)) for _ in range(15)]) for _ in range(quantity)])
+            # Draw all 15-digit IMEIs at once as ASCII digit bytes, one S15 string per unit
+            digits = rng.integers(ord("0"), ord("9") + 1, size=(quantity, 15), dtype=np.uint8)
+            imei = "SIM-" + b",".join(digits.view("S15").ravel()).decode()
             
             cursor.execute("""
             INSERT INTO sales_transactions (
@@ -367,20 +622,26 @@ def add_simulated_sale(dealer_id, product_id, scheme_id, quantity, dealer_price,
                 dealer_price, incentive, imei, "Simulated"
             ))
             conn.commit()
+            has_sales.clear()
+            get_sales_data.clear()
+            get_sales_summary.clear()
             return True
         except Exception as e:
+            conn.rollback()
             st.error(f"Error adding simulated sale: {e}")
             return False
-        finally:
-            conn.close()
-    return False
 
 # --- UI Rendering Functions ---
 
 # Custom CSS
-def load_custom_css():
-    """Load custom CSS for styling"""
-    st.markdown("""
+def minify_css(css):
+    """Strip comments and redundant whitespace from a style block"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", css).strip()
+
+# Static stylesheet, minified once at import
+CUSTOM_CSS = minify_css("""
     <style>
         /* Main header style */
         .main-header {
@@ -416,7 +677,7 @@ def load_custom_css():
         }
         .status-rejected {
             color: red;
-            font_weight: bold;
+            font-weight: bold;
         }
         /* Highlight free items */
         .free-item-highlight {
@@ -429,7 +690,13 @@ def load_custom_css():
             margin-top: 5px;
         }
     </style>
-    """, unsafe_allow_html=True)
+""")
+
+def load_custom_css():
+    """Load custom CSS for styling"""
+    # Streamlit drops any element a rerun does not emit again, so the style
+    # block is re-sent each run; minifying keeps that payload small
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Sidebar navigation
 def render_sidebar():
@@ -438,16 +705,11 @@ def render_sidebar():
     st.sidebar.markdown("---   ")
     
     # Navigation buttons
-    if st.sidebar.button("Dashboard", key="nav_dashboard"):
-        navigate_to("dashboard")
-    if st.sidebar.button("View Schemes", key="nav_schemes"):
-        navigate_to("schemes")
-    if st.sidebar.button("Upload New Scheme", key="nav_upload"):
-        navigate_to("upload")
-    if st.sidebar.button("Scheme Approvals", key="nav_approvals"):
-        navigate_to("approvals")
-    if st.sidebar.button("Simulate Sales", key="nav_simulate"):
-        navigate_to("simulate")
+    st.sidebar.button("Dashboard", key="nav_dashboard", on_click=navigate_to, args=("dashboard",))
+    st.sidebar.button("View Schemes", key="nav_schemes", on_click=navigate_to, args=("schemes",))
+    st.sidebar.button("Upload New Scheme", key="nav_upload", on_click=navigate_to, args=("upload",))
+    st.sidebar.button("Scheme Approvals", key="nav_approvals", on_click=navigate_to, args=("approvals",))
+    st.sidebar.button("Simulate Sales", key="nav_simulate", on_click=navigate_to, args=("simulate",))
     
     st.sidebar.markdown("---")
     st.sidebar.markdown("### About")
@@ -471,45 +733,27 @@ def render_dashboard():
     with col3:
         st.metric("Dealers", len(get_all_dealers()))
     with col4:
-        pending_count = len(get_pending_approvals())
+        pending_count = count_pending_approvals()
         st.metric("Pending Approvals", pending_count)
     
     # Sales data visualization
     st.markdown("<h2 class='sub-header'>Sales Performance</h2>", unsafe_allow_html=True)
     
-    sales_data = get_sales_data(days=30)
-    if sales_data:
+    # Skip the sales joins entirely until the first sale is recorded; once there
+    # are sales, emptiness is judged on the windowed summary itself
+    sales_days = 30
+    sales_summary = get_sales_summary(days=sales_days) if has_sales() else None
+    if sales_summary is not None and not sales_summary.empty:
         try:
-            # Convert to DataFrame for easier manipulation
-            df = pd.DataFrame(sales_data)
-            
-            # Check if required columns exist
-            required_columns = ['product_category', 'quantity_sold', 'earned_dealer_incentive_amount', 
-                               'region', 'sale_timestamp', 'scheme_name']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                st.warning(f"Some required data columns are missing: {', '.join(missing_columns)}. "
-                          "Please ensure your sales data is complete.")
-                st.info("Try simulating some sales to populate the dashboard with data.")
-                return
-            
-            if len(df) == 0:
-                st.info("No sales data available for the selected period. Try simulating some sales first.")
-                return
-            
             # Sales by product category
             st.markdown("<h3>Sales by Product Category</h3>", unsafe_allow_html=True)
-            category_sales = df.groupby('product_category').agg({
-                'quantity_sold': 'sum',
-                'earned_dealer_incentive_amount': 'sum'
-            }).reset_index()
+            category_sales = rollup_sales(sales_summary, 'product_category')
             
             fig1 = px.bar(
                 category_sales, 
                 x='product_category', 
                 y='quantity_sold',
-                color='earned_dealer_incentive_amount',
+                hover_data=['earned_dealer_incentive_amount'],
                 labels={
                     'product_category': 'Product Category',
                     'quantity_sold': 'Units Sold',
@@ -517,14 +761,12 @@ def render_dashboard():
                 },
                 title='Sales and Incentives by Product Category'
             )
+            fig1.update_layout(uirevision="keep")
             st.plotly_chart(fig1, use_container_width=True, key="plot_category_sales")
             
             # Sales by region
             st.markdown("<h3>Sales by Region</h3>", unsafe_allow_html=True)
-            region_sales = df.groupby('region').agg({
-                'quantity_sold': 'sum',
-                'earned_dealer_incentive_amount': 'sum'
-            }).reset_index()
+            region_sales = rollup_sales(sales_summary, 'region')
             
             fig2 = px.pie(
                 region_sales, 
@@ -532,15 +774,12 @@ def render_dashboard():
                 names='region',
                 title='Sales Distribution by Region'
             )
+            fig2.update_layout(uirevision="keep")
             st.plotly_chart(fig2, use_container_width=True, key="plot_region_sales")
             
             # Sales trend
             st.markdown("<h3>Sales Trend</h3>", unsafe_allow_html=True)
-            df['sale_date'] = pd.to_datetime(df['sale_timestamp']).dt.date
-            daily_sales = df.groupby('sale_date').agg({
-                'quantity_sold': 'sum',
-                'earned_dealer_incentive_amount': 'sum'
-            }).reset_index()
+            daily_sales = rollup_sales(sales_summary, 'sale_date')
             
             fig3 = px.line(
                 daily_sales, 
@@ -551,28 +790,27 @@ def render_dashboard():
                     'value': 'Value',
                     'variable': 'Metric'
                 },
-                title='Daily Sales and Incentives'
+                title='Daily Sales and Incentives',
+                render_mode='webgl'
             )
+            fig3.update_layout(uirevision="keep")
             st.plotly_chart(fig3, use_container_width=True, key="plot_sales_trend")
             
             # Scheme effectiveness
             st.markdown("<h3>Scheme Effectiveness</h3>", unsafe_allow_html=True)
-            scheme_effectiveness = df.groupby('scheme_name').agg({
-                'quantity_sold': 'sum',
-                'earned_dealer_incentive_amount': 'sum'
-            }).reset_index()
+            scheme_effectiveness = rollup_sales(sales_summary, 'scheme_name')
             
             # Avoid division by zero
-            scheme_effectiveness['incentive_per_unit'] = scheme_effectiveness.apply(
-                lambda x: x['earned_dealer_incentive_amount'] / x['quantity_sold'] 
-                if x['quantity_sold'] > 0 else 0, axis=1
-            )
+            units = scheme_effectiveness['quantity_sold']
+            scheme_effectiveness['incentive_per_unit'] = (
+                scheme_effectiveness['earned_dealer_incentive_amount'] / units.where(units > 0)
+            ).fillna(0)
             
             fig4 = px.bar(
                 scheme_effectiveness, 
                 x='scheme_name', 
                 y='incentive_per_unit',
-                color='quantity_sold',
+                hover_data=['quantity_sold'],
                 labels={
                     'scheme_name': 'Scheme',
                     'incentive_per_unit': 'Incentive per Unit',
@@ -580,107 +818,99 @@ def render_dashboard():
                 },
                 title='Scheme Effectiveness (Incentive per Unit)'
             )
+            fig4.update_layout(uirevision="keep")
             st.plotly_chart(fig4, use_container_width=True, key="plot_scheme_effectiveness")
         
         except Exception as e:
             st.error(f"Error rendering dashboard visualizations: {str(e)}")
             st.info("This could be due to incomplete or malformed sales data. Try simulating some sales first.")
+    elif sales_summary is not None:
+        st.info(f"No sales recorded in the last {sales_days} days.")
     else:
-        st.info("No sales data available for visualization. Try simulating some sales first.")
-        
-        # Show sample visualization with dummy data
-        st.markdown("<h3>Sample Visualization (Demo Data)</h3>", unsafe_allow_html=True)
-        
-        # Sample product category data
-        sample_categories = pd.DataFrame({
-            'product_category': ['Smartphones', 'Tablets', 'Wearables', 'Accessories'],
-            'quantity_sold': [120, 45, 78, 210],
-            'earned_dealer_incentive_amount': [24000, 13500, 7800, 6300]
-        })
-        
-        fig_sample = px.bar(
-            sample_categories,
-            x='product_category',
-            y='quantity_sold',
-            color='earned_dealer_incentive_amount',
-            labels={
-                'product_category': 'Product Category',
-                'quantity_sold': 'Units Sold (Sample)',
-                'earned_dealer_incentive_amount': 'Incentive Amount (Sample)'
-            },
-            title='Sample Sales Visualization (Demo Data)'
-        )
-        st.plotly_chart(fig_sample, use_container_width=True, key="plot_sample")
+        render_sample_dashboard()
+
+def render_sample_dashboard():
+    """Render the dashboard placeholder shown while there are no sales"""
+    st.info("No sales data available for visualization. Try simulating some sales first.")
+    
+    # Show sample visualization with dummy data
+    st.markdown("<h3>Sample Visualization (Demo Data)</h3>", unsafe_allow_html=True)
+    
+    # Sample product category data
+    sample_categories = pd.DataFrame({
+        'product_category': ['Smartphones', 'Tablets', 'Wearables', 'Accessories'],
+        'quantity_sold': [120, 45, 78, 210],
+        'earned_dealer_incentive_amount': [24000, 13500, 7800, 6300]
+    })
+    
+    fig_sample = px.bar(
+        sample_categories,
+        x='product_category',
+        y='quantity_sold',
+        hover_data=['earned_dealer_incentive_amount'],
+        labels={
+            'product_category': 'Product Category',
+            'quantity_sold': 'Units Sold (Sample)',
+            'earned_dealer_incentive_amount': 'Incentive Amount (Sample)'
+        },
+        title='Sample Sales Visualization (Demo Data)'
+    )
+    st.plotly_chart(fig_sample, use_container_width=True, key="plot_sample")
+
+# Scheme columns the schemes page filters on
+SCHEME_FILTER_COLUMNS = ["applicable_region", "scheme_type"]
 
 # Schemes page
 def render_schemes():
     """Render the schemes page"""
     st.markdown("<h1 class='main-header'>Available Schemes</h1>", unsafe_allow_html=True)
     
+    # Load schemes into a frame once; the filters become column masks
+    schemes = get_active_schemes()
+    schemes_df = pd.DataFrame(schemes) if schemes else pd.DataFrame(columns=SCHEME_FILTER_COLUMNS)
+    regions = schemes_df["applicable_region"].dropna().unique()
+    scheme_types = schemes_df["scheme_type"].dropna().unique()
+    
     # Filter options
     st.markdown("<h2 class='sub-header'>Filter Schemes</h2>", unsafe_allow_html=True)
     col1, col2 = st.columns(2)
     
     with col1:
-        # Get unique regions from schemes
-        regions = ["All"]
-        for scheme in get_active_schemes():
-            if "applicable_region" in scheme.keys():
-                region = scheme["applicable_region"]
-                if region and region not in regions:
-                    regions.append(region)
-        
         filter_region = st.selectbox(
             "Region",
-            regions,
+            ["All"] + sorted(regions),
             key="filter_region"
         )
     
     with col2:
-        # Get unique scheme types
-        scheme_types = ["All"]
-        for scheme in get_active_schemes():
-            if "scheme_type" in scheme.keys():
-                scheme_type = scheme["scheme_type"]
-                if scheme_type and scheme_type not in scheme_types:
-                    scheme_types.append(scheme_type)
-        
         filter_type = st.selectbox(
             "Scheme Type",
-            scheme_types,
+            ["All"] + sorted(scheme_types),
             key="filter_type"
         )
     
     # Apply filters
-    filtered_schemes = get_active_schemes()
+    mask = np.ones(len(schemes_df), dtype=bool)
     if filter_region != "All":
-        filtered_schemes = [s for s in filtered_schemes if "applicable_region" in s.keys() and s["applicable_region"] == filter_region]
+        mask &= schemes_df["applicable_region"] == filter_region
     if filter_type != "All":
-        filtered_schemes = [s for s in filtered_schemes if "scheme_type" in s.keys() and s["scheme_type"] == filter_type]
+        mask &= schemes_df["scheme_type"] == filter_type
+    filtered_schemes = [schemes[i] for i in np.flatnonzero(mask)]
     
     # Display schemes as cards
     for scheme in filtered_schemes:
-        st.markdown("<div class=\"card\">", unsafe_allow_html=True)
-        
         # Safely access scheme attributes
-        scheme_name = scheme["scheme_name"] if "scheme_name" in scheme.keys() else "Unnamed Scheme"
-        scheme_type = scheme["scheme_type"] if "scheme_type" in scheme.keys() else "Unknown Type"
-        period_start = scheme["scheme_period_start"] if "scheme_period_start" in scheme.keys() else "Unknown"
-        period_end = scheme["scheme_period_end"] if "scheme_period_end" in scheme.keys() else "Unknown"
-        region = scheme["applicable_region"] if "applicable_region" in scheme.keys() else "Unknown"
-        eligibility = scheme["dealer_type_eligibility"] if "dealer_type_eligibility" in scheme.keys() else "Unknown"
-        
-        st.markdown(f"### {scheme_name}")
-        st.markdown(f"**Type:** {scheme_type}")
-        st.markdown(f"**Period:** {period_start} to {period_end}")
-        st.markdown(f"**Region:** {region}")
-        st.markdown(f"**Dealer Eligibility:** {eligibility}")
-        
-        if st.button("View Details", key=f"view_scheme_{scheme['scheme_id']}"):
-            st.session_state.current_scheme = scheme["scheme_id"]
-            navigate_to("scheme_details")
+        period_start = scheme.get("scheme_period_start", "Unknown")
+        period_end = scheme.get("scheme_period_end", "Unknown")
+        st.markdown(card_html(scheme.get("scheme_name", "Unnamed Scheme"), {
+            "Type": scheme.get("scheme_type", "Unknown Type"),
+            "Period": f"{period_start} to {period_end}",
+            "Region": scheme.get("applicable_region", "Unknown"),
+            "Dealer Eligibility": scheme.get("dealer_type_eligibility", "Unknown")
+        }), unsafe_allow_html=True)
         
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.button("View Details", key=f"view_scheme_{scheme['scheme_id']}",
+                  on_click=open_scheme_details, args=(scheme["scheme_id"],))
     
     if not filtered_schemes:
         st.info("No schemes match the selected filters. Try adjusting your filter criteria or upload new schemes.")
@@ -689,21 +919,22 @@ def render_schemes():
 def render_scheme_details():
     """Render the scheme details page"""
     scheme_id = st.session_state.current_scheme
-    scheme = get_scheme_details(scheme_id)
+    bundle = get_scheme_bundle(scheme_id)
     
-    if not scheme:
+    if not bundle:
         st.error("Scheme not found.")
         return
+    scheme = bundle["scheme"]
     
     # Safely access scheme attributes
-    scheme_name = scheme["scheme_name"] if "scheme_name" in scheme.keys() else "Unnamed Scheme"
-    scheme_type = scheme["scheme_type"] if "scheme_type" in scheme.keys() else "Unknown Type"
-    period_start = scheme["scheme_period_start"] if "scheme_period_start" in scheme.keys() else "Unknown"
-    period_end = scheme["scheme_period_end"] if "scheme_period_end" in scheme.keys() else "Unknown"
-    region = scheme["applicable_region"] if "applicable_region" in scheme.keys() else "Unknown"
-    eligibility = scheme["dealer_type_eligibility"] if "dealer_type_eligibility" in scheme.keys() else "Unknown"
-    deal_status = scheme["deal_status"] if "deal_status" in scheme.keys() else "Unknown"
-    approval_status = scheme["approval_status"] if "approval_status" in scheme.keys() else "Unknown"
+    scheme_name = scheme.get("scheme_name", "Unnamed Scheme")
+    scheme_type = scheme.get("scheme_type", "Unknown Type")
+    period_start = scheme.get("scheme_period_start", "Unknown")
+    period_end = scheme.get("scheme_period_end", "Unknown")
+    region = scheme.get("applicable_region", "Unknown")
+    eligibility = scheme.get("dealer_type_eligibility", "Unknown")
+    deal_status = scheme.get("deal_status", "Unknown")
+    approval_status = scheme.get("approval_status", "Unknown")
     
     st.markdown(f"<h1 class='main-header'>{scheme_name}</h1>", unsafe_allow_html=True)
     
@@ -712,57 +943,112 @@ def render_scheme_details():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown(f"**Type:** {scheme_type}")
-        st.markdown(f"**Period:** {period_start} to {period_end}")
-        st.markdown(f"**Region:** {region}")
+        st.markdown(
+            f"**Type:** {scheme_type}  \n"
+            f"**Period:** {period_start} to {period_end}  \n"
+            f"**Region:** {region}"
+        )
     
     with col2:
-        st.markdown(f"**Dealer Eligibility:** {eligibility}")
-        st.markdown(f"**Status:** {deal_status}")
-        st.markdown(f"**Approval Status:** {approval_status}")
+        st.markdown(
+            f"**Dealer Eligibility:** {eligibility}  \n"
+            f"**Status:** {deal_status}  \n"
+            f"**Approval Status:** {approval_status}"
+        )
     
     # Products in scheme
     st.markdown("<h2 class='sub-header'>Products</h2>", unsafe_allow_html=True)
-    products = get_scheme_products(scheme_id)
+    products = bundle["products"]
     
     for product in products:
-        st.markdown("<div class=\"card\">", unsafe_allow_html=True)
-        
         # Safely access product attributes
-        product_name = product["product_name"] if "product_name" in product.keys() else "Unnamed Product"
-        product_code = product["product_code"] if "product_code" in product.keys() else "Unknown Code"
-        product_category = product["product_category"] if "product_category" in product.keys() else "Unknown Category"
-        support_type = product["support_type"] if "support_type" in product.keys() else "Unknown Support"
-        payout_type = product["payout_type"] if "payout_type" in product.keys() else "Unknown Payout Type"
-        payout_amount = product["payout_amount"] if "payout_amount" in product.keys() else 0
-        payout_unit = product["payout_unit"] if "payout_unit" in product.keys() else "INR"
-        
-        st.markdown(f"### {product_name} ({product_code})")
-        st.markdown(f"**Category:** {product_category}")
-        st.markdown(f"**Support Type:** {support_type}")
-        st.markdown(f"**Payout:** {payout_amount} {payout_unit} ({payout_type})")
+        product_name = product.get("product_name", "Unnamed Product")
+        product_code = product.get("product_code", "Unknown Code")
+        payout_type = product.get("payout_type", "Unknown Payout Type")
+        payout_amount = product.get("payout_amount", 0)
+        payout_unit = product.get("payout_unit", "INR")
         
-        # Display free item if available
-        free_item = product["free_item_description"] if "free_item_description" in product.keys() else None
-        if free_item:
-            st.markdown(f"<div class='free-item-highlight'>🎁 FREE: {free_item}</div>", unsafe_allow_html=True)
+        # Display quantity slabs if the payout is slab based
+        slab_items = []
+        for slab in product["slabs"]:
+            if slab["max_quantity"] is not None:
+                slab_range = f"{slab['min_quantity']}-{slab['max_quantity']}"
+            else:
+                slab_range = f"{slab['min_quantity']}+"
+            slab_items.append(f"<li><b>{slab_range} units:</b> {escape_html(slab['slab_payout_amount'])} {escape_html(payout_unit)}</li>")
+        slabs_html = f"<ul>{''.join(slab_items)}</ul>" if slab_items else ""
         
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown(card_html(f"{product_name} ({product_code})", {
+            "Category": product.get("product_category", "Unknown Category"),
+            "Support Type": product.get("support_type", "Unknown Support"),
+            "Payout": f"{payout_amount} {payout_unit} ({payout_type})"
+        }, free_item=product.get("free_item_description"), extra_html=slabs_html), unsafe_allow_html=True)
     
     # Scheme rules
     st.markdown("<h2 class='sub-header'>Rules</h2>", unsafe_allow_html=True)
     rules = get_scheme_rules(scheme_id)
     
+    rule_lines = []
     for rule in rules:
         # Safely access rule attributes
-        rule_type = rule["rule_type"] if "rule_type" in rule.keys() else "General"
-        rule_description = rule["rule_description"] if "rule_description" in rule.keys() else "No description"
+        rule_type = rule.get("rule_type", "General")
+        rule_description = rule.get("rule_description", "No description")
         
-        st.markdown(f"**{rule_type}:** {rule_description}")
+        rule_lines.append(f"**{rule_type}:** {rule_description}")
+    
+    if rule_lines:
+        st.markdown("\n\n".join(rule_lines))
     
     # Back button
-    if st.button("Back to Schemes"):
-        navigate_to("schemes")
+    st.button("Back to Schemes", on_click=navigate_to, args=("schemes",))
+
+def show_more_text_pages():
+    """Reveal the next batch of pages in the extracted text view"""
+    st.session_state.shown_text_pages = st.session_state.get("shown_text_pages", PREVIEW_PAGES) + PREVIEW_PAGES
+
+# Products shown per page when editing an extracted scheme
+PRODUCTS_PER_PAGE = 10
+
+# Upload form input key prefixes and the product fields they edit
+PRODUCT_EDIT_FIELDS = (
+    ("product_name", "product_name"),
+    ("product_code", "product_code"),
+    ("product_category", "product_category"),
+    ("support_type", "support_type"),
+    ("payout_type", "payout_type"),
+    ("payout_amount", "payout_amount"),
+    ("free_item", "free_item_description")
+)
+
+# Upload form inputs for the scheme details; each input key is the field it edits
+SCHEME_EDIT_FIELDS = (
+    "scheme_name",
+    "scheme_type",
+    "scheme_period_start",
+    "scheme_period_end",
+    "applicable_region",
+    "dealer_type_eligibility"
+)
+
+def apply_upload_edits(structured_data, page_start, page_end):
+    """Copy the submitted upload form values into structured_data"""
+    for field in SCHEME_EDIT_FIELDS:
+        structured_data[field] = st.session_state[field]
+    
+    # Only the shown page has inputs; other products keep their earlier values
+    products = structured_data.get("products", [])
+    for i in range(page_start, page_end):
+        for input_prefix, field in PRODUCT_EDIT_FIELDS:
+            products[i][field] = st.session_state[f"{input_prefix}_{i}"]
+    
+    for i, rule in enumerate(structured_data.get("scheme_rules", [])):
+        rule["rule_type"] = st.session_state[f"rule_type_{i}"]
+        rule["rule_description"] = st.session_state[f"rule_description_{i}"]
+
+def change_product_page(structured_data, page_start, page_end, product_page):
+    """Keep the current page's edits, then switch the upload form to another product page"""
+    apply_upload_edits(structured_data, page_start, page_end)
+    st.session_state.product_page = product_page
 
 # Upload page
 def render_upload():
@@ -773,166 +1059,252 @@ def render_upload():
     uploaded_file = st.file_uploader("Upload Scheme PDF", type=["pdf"])
     
     if uploaded_file:
-        st.session_state.uploaded_pdf = save_uploaded_pdf(uploaded_file)
+        # Start extraction in the background once per uploaded file
+        job = st.session_state.get("extraction_job")
+        if job is None or job["file_id"] != uploaded_file.file_id:
+            # Kept in memory until the scheme is saved; nothing is written to disk yet
+            pdf_bytes = uploaded_file.getvalue()
+            st.session_state.uploaded_pdf_bytes = pdf_bytes
+            st.session_state.shown_text_pages = PREVIEW_PAGES
+            st.session_state.product_page = 1
+            job = {
+                "file_id": uploaded_file.file_id,
+                "started_at": time.monotonic(),
+                "future": submit_scheme_extraction(
+                    hashlib.sha256(pdf_bytes).hexdigest(), uploaded_file.name, pdf_bytes
+                )
+            }
+            st.session_state.extraction_job = job
         st.success(f"File uploaded: {uploaded_file.name}")
         
-        # Extract text from PDF
-        with st.spinner("Extracting text from PDF..."):
-            extracted_text = extract_text_from_pdf(st.session_state.uploaded_pdf)
-            st.session_state.extracted_text = extracted_text
+        # Only the status fragment polls the worker; the rest of the page is not
+        # rerun until the result is ready, and the sidebar stays usable meanwhile
+        if not job["future"].done():
+            show_extraction_status(job)
+            return
+        
+        # The future's result is shared with other sessions, so the edits below go
+        # into this session's own copy
+        if "structured_data" not in job:
+            try:
+                job["structured_data"] = copy.deepcopy(job["future"].result())
+            except Exception as e:
+                st.error(f"Error extracting data from PDF: {e}")
+                return
+        structured_data = job["structured_data"]
+        if not structured_data:
+            st.error("Could not extract scheme data from this PDF. Please check the file and try again.")
+            return
+        st.session_state.structured_data = structured_data
         
         # Display extracted text
         st.markdown("<h2 class='sub-header'>Extracted Text</h2>", unsafe_allow_html=True)
-        with st.expander("Show Extracted Text", expanded=False):
-            for page_num, text in enumerate(extracted_text, start=1):
+        # Page text is only loaded, from the extraction cache, when asked for
+        if st.toggle("Show Extracted Text", key="show_extracted_text"):
+            pages = extract_pdf_text(st.session_state.uploaded_pdf_bytes)
+            shown_pages = st.session_state.get("shown_text_pages", PREVIEW_PAGES)
+            for page_num, text in pages[:shown_pages]:
                 st.markdown(f"### Page {page_num}")
                 st.text(text)
+            if len(pages) > shown_pages:
+                st.button("Show More Pages", on_click=show_more_text_pages)
 
         
-        # Extract structured data
-        with st.spinner("Extracting structured data..."):
-            structured_data = extract_structured_data_from_text(extracted_text)
-            st.session_state.structured_data = structured_data
-        
         # Display structured data
         st.markdown("<h2 class='sub-header'>Extracted Scheme Data</h2>", unsafe_allow_html=True)
         
-        # Scheme details
-        st.markdown("<h3>Scheme Details</h3>", unsafe_allow_html=True)
-        scheme_name = structured_data.get("scheme_name", "Unknown Scheme")
-        scheme_type = structured_data.get("scheme_type", "Unknown Type")
-        scheme_period_start = structured_data.get("scheme_period_start", "Unknown")
-        scheme_period_end = structured_data.get("scheme_period_end", "Unknown")
-        applicable_region = structured_data.get("applicable_region", "Unknown")
-        dealer_type_eligibility = structured_data.get("dealer_type_eligibility", "Unknown")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            st.text_input("Scheme Name", value=scheme_name, key="scheme_name")
-            st.text_input("Scheme Type", value=scheme_type, key="scheme_type")
-            st.text_input("Start Date", value=scheme_period_start, key="scheme_period_start")
-        with col2:
-            st.text_input("End Date", value=scheme_period_end, key="scheme_period_end")
-            st.text_input("Region", value=applicable_region, key="applicable_region")
-            st.text_input("Dealer Eligibility", value=dealer_type_eligibility, key="dealer_type_eligibility")
-        
-        # Products
-        st.markdown("<h3>Products</h3>", unsafe_allow_html=True)
+        # Long product lists are paged; only the current page's inputs are built.
+        # The page buttons submit the form, so the shown page's edits are written
+        # back into structured_data before its inputs go away
         products = structured_data.get("products", [])
+        page_count = max(1, math.ceil(len(products) / PRODUCTS_PER_PAGE))
+        product_page = min(max(1, st.session_state.get("product_page", 1)), page_count)
+        page_start = (product_page - 1) * PRODUCTS_PER_PAGE
+        page_end = min(page_start + PRODUCTS_PER_PAGE, len(products))
+        
+        # Edits are batched in a form so typing does not rerun the page
+        with st.form("edit_scheme"):
+            # Scheme details
+            st.markdown("<h3>Scheme Details</h3>", unsafe_allow_html=True)
+            scheme_name = structured_data.get("scheme_name", "Unknown Scheme")
+            scheme_type = structured_data.get("scheme_type", "Unknown Type")
+            scheme_period_start = structured_data.get("scheme_period_start", "Unknown")
+            scheme_period_end = structured_data.get("scheme_period_end", "Unknown")
+            applicable_region = structured_data.get("applicable_region", "Unknown")
+            dealer_type_eligibility = structured_data.get("dealer_type_eligibility", "Unknown")
         
-        for i, product in enumerate(products):
-            st.markdown(f"#### Product {i+1}")
             col1, col2 = st.columns(2)
             with col1:
-                st.text_input("Product Name", value=product.get("product_name", ""), key=f"product_name_{i}")
-                st.text_input("Product Code", value=product.get("product_code", ""), key=f"product_code_{i}")
-                st.text_input("Category", value=product.get("product_category", ""), key=f"product_category_{i}")
+                st.text_input("Scheme Name", value=scheme_name, key="scheme_name")
+                st.text_input("Scheme Type", value=scheme_type, key="scheme_type")
+                st.text_input("Start Date", value=scheme_period_start, key="scheme_period_start")
             with col2:
-                st.text_input("Support Type", value=product.get("support_type", ""), key=f"support_type_{i}")
-                st.text_input("Payout Type", value=product.get("payout_type", ""), key=f"payout_type_{i}")
-                st.text_input("Payout Amount", value=str(product.get("payout_amount", "")), key=f"payout_amount_{i}")
-                st.text_input("Free Item", value=product.get("free_item_description", ""), key=f"free_item_{i}")
+                st.text_input("End Date", value=scheme_period_end, key="scheme_period_end")
+                st.text_input("Region", value=applicable_region, key="applicable_region")
+                st.text_input("Dealer Eligibility", value=dealer_type_eligibility, key="dealer_type_eligibility")
         
-        # Rules
-        st.markdown("<h3>Rules</h3>", unsafe_allow_html=True)
-        rules = structured_data.get("scheme_rules", [])
+            # Products
+            st.markdown("<h3>Products</h3>", unsafe_allow_html=True)
+            if page_count > 1:
+                st.caption(f"Showing products {page_start + 1}-{page_end} of {len(products)}")
         
-        for i, rule in enumerate(rules):
-            col1, col2 = st.columns(2)
-            with col1:
-                st.text_input("Rule Type", value=rule.get("rule_type", ""), key=f"rule_type_{i}")
-            with col2:
-                st.text_input("Rule Description", value=rule.get("rule_description", ""), key=f"rule_description_{i}")
+            for i in range(page_start, page_end):
+                product = products[i]
+                with st.expander(f"Product {i+1}: {product.get('product_name') or ''}", expanded=False):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.text_input("Product Name", value=product.get("product_name", ""), key=f"product_name_{i}")
+                        st.text_input("Product Code", value=product.get("product_code", ""), key=f"product_code_{i}")
+                        st.text_input("Category", value=product.get("product_category", ""), key=f"product_category_{i}")
+                    with col2:
+                        st.text_input("Support Type", value=product.get("support_type", ""), key=f"support_type_{i}")
+                        st.text_input("Payout Type", value=product.get("payout_type", ""), key=f"payout_type_{i}")
+                        st.text_input("Payout Amount", value=str(product.get("payout_amount", "")), key=f"payout_amount_{i}")
+                        st.text_input("Free Item", value=product.get("free_item_description", ""), key=f"free_item_{i}")
+        
+            if page_count > 1:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.form_submit_button(
+                        "Previous Products", disabled=product_page == 1, on_click=change_product_page,
+                        args=(structured_data, page_start, page_end, product_page - 1)
+                    )
+                with col2:
+                    st.form_submit_button(
+                        "Next Products", disabled=product_page == page_count, on_click=change_product_page,
+                        args=(structured_data, page_start, page_end, product_page + 1)
+                    )
+        
+            # Rules
+            st.markdown("<h3>Rules</h3>", unsafe_allow_html=True)
+            rules = structured_data.get("scheme_rules", [])
+        
+            for i, rule in enumerate(rules):
+                with st.expander(f"Rule {i+1}: {rule.get('rule_type') or ''}", expanded=False):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.text_input("Rule Type", value=rule.get("rule_type", ""), key=f"rule_type_{i}")
+                    with col2:
+                        st.text_input("Rule Description", value=rule.get("rule_description", ""), key=f"rule_description_{i}")
+            
+            submitted = st.form_submit_button("Save Scheme")
         
         # Save to database
-        if st.button("Save Scheme"):
+        if submitted:
             with st.spinner("Saving scheme to database..."):
-                # Update structured data with edited values
-                structured_data["scheme_name"] = st.session_state.scheme_name
-                structured_data["scheme_type"] = st.session_state.scheme_type
-                structured_data["scheme_period_start"] = st.session_state.scheme_period_start
-                structured_data["scheme_period_end"] = st.session_state.scheme_period_end
-                structured_data["applicable_region"] = st.session_state.applicable_region
-                structured_data["dealer_type_eligibility"] = st.session_state.dealer_type_eligibility
-                
-                for i, product in enumerate(products):
-                    product["product_name"] = st.session_state[f"product_name_{i}"]
-                    product["product_code"] = st.session_state[f"product_code_{i}"]
-                    product["product_category"] = st.session_state[f"product_category_{i}"]
-                    product["support_type"] = st.session_state[f"support_type_{i}"]
-                    product["payout_type"] = st.session_state[f"payout_type_{i}"]
-                    product["payout_amount"] = float(st.session_state[f"payout_amount_{i}"])
-                    product["free_item_description"] = st.session_state[f"free_item_{i}"]
+                # Update structured data with edited values; edits made on other
+                # product pages were applied when the page was switched
+                apply_upload_edits(structured_data, page_start, page_end)
                 
-                for i, rule in enumerate(rules):
-                    rule["rule_type"] = st.session_state[f"rule_type_{i}"]
-                    rule["rule_description"] = st.session_state[f"rule_description_{i}"]
+                # Convert every payout amount in one pass; unparseable amounts become 0
+                if products:
+                    payout_amounts = pd.to_numeric(
+                        pd.Series([product["payout_amount"] for product in products], dtype=object),
+                        errors="coerce"
+                    ).fillna(0)
+                    for product, payout_amount in zip(products, payout_amounts.tolist()):
+                        product["payout_amount"] = payout_amount
                 
                 # Save to database
-                scheme_id = add_new_scheme_from_data(structured_data, st.session_state.uploaded_pdf)
+                pdf_path = save_uploaded_pdf(uploaded_file)
+                scheme_id = add_new_scheme_from_data(structured_data, pdf_path)
                 
                 if scheme_id:
                     st.success("Scheme saved successfully! Awaiting approval.")
                     # Clear session state
-                    st.session_state.uploaded_pdf = None
-                    st.session_state.extracted_text = None
+                    st.session_state.uploaded_pdf_bytes = None
                     st.session_state.structured_data = None
+                    st.session_state.extraction_job = None
                     # Navigate to schemes page
                     navigate_to("schemes")
+                    st.rerun()
                 else:
+                    os.remove(pdf_path)
                     st.error("Failed to save scheme. Please try again.")
 
+# Scheme columns shown in the approvals table
+APPROVAL_COLUMNS = [
+    "scheme_id", "scheme_name", "scheme_type", "scheme_period_start",
+    "scheme_period_end", "applicable_region", "dealer_type_eligibility", "upload_timestamp"
+]
+
+def reset_approvals_selection():
+    """Clear the approvals table's ticks by moving its editor to a fresh key"""
+    st.session_state.approvals_editor_nonce = st.session_state.get("approvals_editor_nonce", 0) + 1
+
 # Approvals page
 def render_approvals():
     """Render the approvals page"""
     st.markdown("<h1 class='main-header'>Scheme Approvals</h1>", unsafe_allow_html=True)
     
-    pending_schemes = get_pending_approvals()
+    pending_count = count_pending_approvals()
     
-    if not pending_schemes:
+    if not pending_count:
         st.info("No schemes pending approval.")
         return
     
-    for scheme in pending_schemes:
-        st.markdown("<div class=\"card\">", unsafe_allow_html=True)
-        
-        # Safely access scheme attributes
-        scheme_name = scheme["scheme_name"] if "scheme_name" in scheme.keys() else "Unnamed Scheme"
-        scheme_type = scheme["scheme_type"] if "scheme_type" in scheme.keys() else "Unknown Type"
-        period_start = scheme["scheme_period_start"] if "scheme_period_start" in scheme.keys() else "Unknown"
-        period_end = scheme["scheme_period_end"] if "scheme_period_end" in scheme.keys() else "Unknown"
-        region = scheme["applicable_region"] if "applicable_region" in scheme.keys() else "Unknown"
-        eligibility = scheme["dealer_type_eligibility"] if "dealer_type_eligibility" in scheme.keys() else "Unknown"
-        upload_timestamp = scheme["upload_timestamp"] if "upload_timestamp" in scheme.keys() else "Unknown"
-        
-        st.markdown(f"### {scheme_name}")
-        st.markdown(f"**Type:** {scheme_type}")
-        st.markdown(f"**Period:** {period_start} to {period_end}")
-        st.markdown(f"**Region:** {region}")
-        st.markdown(f"**Dealer Eligibility:** {eligibility}")
-        st.markdown(f"**Uploaded:** {upload_timestamp}")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Approve", key=f"approve_{scheme['scheme_id']}"):
-                if update_scheme_status(scheme['scheme_id'], "Approved"):
-                    st.success("Scheme approved!")
-                    # Clear cache to refresh data
-                    get_active_schemes.cache_clear()
-                    get_pending_approvals.cache_clear()
-                    # Rerun to refresh page
-                    st.rerun()
-        with col2:
-            if st.button("Reject", key=f"reject_{scheme['scheme_id']}"):
-                if update_scheme_status(scheme['scheme_id'], "Rejected"):
-                    st.success("Scheme rejected!")
-                    # Clear cache to refresh data
-                    get_active_schemes.cache_clear()
-                    get_pending_approvals.cache_clear()
-                    # Rerun to refresh page
-                    st.rerun()
-        
-        st.markdown("</div>", unsafe_allow_html=True)
+    # Only one page of pending schemes is fetched and rendered at a time
+    page_count = math.ceil(pending_count / APPROVALS_PER_PAGE)
+    approvals_page = 1
+    if page_count > 1:
+        # Approving the last page's schemes can leave the stored page past the end
+        if st.session_state.get("approvals_page", 1) > page_count:
+            st.session_state.approvals_page = page_count
+        approvals_page = st.number_input("Page", min_value=1, max_value=page_count, key="approvals_page")
+        st.caption(f"{pending_count} schemes pending approval")
+    pending_schemes = get_pending_approvals(approvals_page)
+    
+    # One editable table for the whole page; only the Select column is editable
+    pending_df = pd.DataFrame(pending_schemes, columns=APPROVAL_COLUMNS)
+    pending_df.insert(0, "select", False)
+    edited_df = st.data_editor(
+        pending_df,
+        column_config={
+            "select": st.column_config.CheckboxColumn("Select"),
+            "scheme_id": "ID",
+            "scheme_name": "Scheme",
+            "scheme_type": "Type",
+            "scheme_period_start": "Start",
+            "scheme_period_end": "End",
+            "applicable_region": "Region",
+            "dealer_type_eligibility": "Dealer Eligibility",
+            "upload_timestamp": "Uploaded"
+        },
+        disabled=APPROVAL_COLUMNS,
+        hide_index=True,
+        use_container_width=True,
+        # The editor keeps ticks by row position; the nonce drops them once the
+        # ticked schemes are handled so the rows moving up start unticked
+        key=f"approvals_editor_{approvals_page}_{st.session_state.get('approvals_editor_nonce', 0)}"
+    )
+    selected_ids = edited_df.loc[edited_df["select"], "scheme_id"].tolist()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Approve Selected", disabled=not selected_ids):
+            if update_scheme_statuses(selected_ids, "Approved"):
+                st.success(f"{len(selected_ids)} scheme(s) approved!")
+                reset_approvals_selection()
+                # Rerun to refresh page
+                st.rerun()
+    with col2:
+        if st.button("Reject Selected", disabled=not selected_ids):
+            if update_scheme_statuses(selected_ids, "Rejected"):
+                st.success(f"{len(selected_ids)} scheme(s) rejected!")
+                reset_approvals_selection()
+                # Rerun to refresh page
+                st.rerun()
+
+# Incentive per payout type, as fn(dealer_price, quantity, payout_amount)
+INCENTIVE_FNS = {
+    "Fixed": lambda dealer_price, quantity, payout_amount: payout_amount * quantity,
+    "Percentage": lambda dealer_price, quantity, payout_amount: (dealer_price * payout_amount / 100) * quantity
+}
+
+def build_options(rows, id_key, name_key):
+    """Build selectbox options from rows as a tuple of ids and an id-to-name mapping"""
+    option_names = {row[id_key]: row[name_key] for row in rows if id_key in row and name_key in row}
+    return tuple(option_names), option_names
 
 # Simulate sales page
 def render_simulate_sales():
@@ -947,76 +1319,63 @@ def render_simulate_sales():
     with col1:
         # Select dealer
         dealers = get_all_dealers()
-        dealer_options = {}
-        for dealer in dealers:
-            if "dealer_id" in dealer.keys() and "dealer_name" in dealer.keys():
-                dealer_options[dealer["dealer_id"]] = dealer["dealer_name"]
+        dealer_ids, dealer_options = build_options(dealers, "dealer_id", "dealer_name")
         
-        dealer_id = st.selectbox("Select Dealer", options=list(dealer_options.keys()), format_func=lambda x: dealer_options[x])
+        dealer_id = st.selectbox("Select Dealer", options=dealer_ids, format_func=dealer_options.get)
         
         # Select scheme
         schemes = get_active_schemes()
-        scheme_options = {}
-        for scheme in schemes:
-            if "scheme_id" in scheme.keys() and "scheme_name" in scheme.keys():
-                scheme_options[scheme["scheme_id"]] = scheme["scheme_name"]
+        scheme_ids, scheme_options = build_options(schemes, "scheme_id", "scheme_name")
         
-        scheme_id = st.selectbox("Select Scheme", options=list(scheme_options.keys()), format_func=lambda x: scheme_options[x])
+        scheme_id = st.selectbox("Select Scheme", options=scheme_ids, format_func=scheme_options.get)
     
     with col2:
         # Select product based on scheme
         products = get_scheme_products(scheme_id) if scheme_id else []
-        product_options = {}
-        for product in products:
-            if "product_id" in product.keys() and "product_name" in product.keys():
-                product_options[product["product_id"]] = product["product_name"]
-        
-        product_id = st.selectbox("Select Product", options=list(product_options.keys()), format_func=lambda x: product_options[x]) if products else None
+        products_by_id = {
+            product["product_id"]: product
+            for product in products
+            if "product_id" in product
+        }
+        product_ids, product_options = build_options(products_by_id.values(), "product_id", "product_name")
         
-        # Quantity
-        quantity = st.number_input("Quantity", min_value=1, value=1)
+        product_id = st.selectbox("Select Product", options=product_ids, format_func=product_options.get) if products else None
+    
+    if dealer_id and scheme_id and product_id:
+        render_sale_calculation(
+            dealer_id, scheme_id, product_id, products_by_id.get(product_id),
+            dealer_options[dealer_id], scheme_options[scheme_id], product_options[product_id]
+        )
+
+# Quantity edits rerun only this block, not the dealer, scheme and product lookups above
+@st.fragment
+def render_sale_calculation(dealer_id, scheme_id, product_id, selected_product, dealer_name, scheme_name, product_name):
+    """Render the quantity input, incentive calculation and sale button for the selected product"""
+    # Quantity
+    quantity = st.number_input("Quantity", min_value=1, value=1)
     
     # Calculate dealer price and incentive
     dealer_price = None
     incentive = None
     free_item = None
     
-    if product_id and scheme_id:
-        # Find the selected product in the scheme products
-        selected_product = None
-        for p in products:
-            if "product_id" in p.keys() and p["product_id"] == product_id:
-                selected_product = p
-                break
+    if selected_product:
+        # Calculate dealer price (simplified for simulation)
+        # Safely access dealer_price or use default
+        dealer_price = selected_product.get("dealer_price", 10000)
         
-        if selected_product:
-            # Calculate dealer price (simplified for simulation)
-            # Safely access dealer_price or use default
-            try:
-                dealer_price = selected_product["dealer_price"] if "dealer_price" in selected_product.keys() else 10000
-            except (KeyError, TypeError):
-                dealer_price = 10000  # Default value if not specified
-            
-            # Calculate incentive based on payout type
-            try:
-                payout_type = selected_product["payout_type"] if "payout_type" in selected_product.keys() else "Fixed"
-                payout_amount = selected_product["payout_amount"] if "payout_amount" in selected_product.keys() else 1000
-                
-                if payout_type == "Fixed":
-                    incentive = payout_amount * quantity
-                elif payout_type == "Percentage":
-                    incentive = (dealer_price * payout_amount / 100) * quantity
-                else:
-                    incentive = payout_amount * quantity
-            except (KeyError, TypeError):
-                incentive = 1000 * quantity  # Default value if calculation fails
-            
-            # Check for free item
-            try:
-                free_item = selected_product["free_item_description"] if "free_item_description" in selected_product.keys() else None
-            except (KeyError, TypeError):
-                free_item = None
-    
+        # Calculate incentive based on payout type; unknown types pay a fixed amount
+        payout_type = selected_product.get("payout_type", "Fixed")
+        payout_amount = selected_product.get("payout_amount", 1000)
+        incentive_fn = INCENTIVE_FNS.get(payout_type, INCENTIVE_FNS["Fixed"])
+        try:
+            incentive = incentive_fn(dealer_price, quantity, payout_amount)
+        except TypeError:
+            incentive = 1000 * quantity  # Default value if a price or amount is missing
+        
+        # Check for free item
+        free_item = selected_product.get("free_item_description")
+
     # Display calculated values
     if dealer_price is not None and incentive is not None:
         st.markdown("<h2 class='sub-header'>Calculation</h2>", unsafe_allow_html=True)
@@ -1039,9 +1398,9 @@ def render_simulate_sales():
             if add_simulated_sale(dealer_id, product_id, scheme_id, quantity, dealer_price, incentive):
                 # Store simulation results
                 st.session_state.simulation_results = {
-                    "dealer_name": dealer_options[dealer_id],
-                    "scheme_name": scheme_options[scheme_id],
-                    "product_name": product_options[product_id],
+                    "dealer_name": dealer_name,
+                    "scheme_name": scheme_name,
+                    "product_name": product_name,
                     "quantity": quantity,
                     "dealer_price": dealer_price,
                     "total_value": dealer_price * quantity,
@@ -1050,25 +1409,18 @@ def render_simulate_sales():
                 }
                 st.session_state.show_simulation_results = True
                 
-                # Clear cache to refresh data
-                get_sales_data.cache_clear()
-                
                 # Show success message
                 st.success("Sale simulated successfully!")
                 
                 # Show simulation results
                 st.markdown("<h2 class='sub-header'>Simulation Results</h2>", unsafe_allow_html=True)
-                st.markdown("<div class=\"card\">", unsafe_allow_html=True)
-                st.markdown(f"### Sale to {st.session_state.simulation_results['dealer_name']}")
-                st.markdown(f"**Product:** {st.session_state.simulation_results['product_name']}")
-                st.markdown(f"**Quantity:** {st.session_state.simulation_results['quantity']}")
-                st.markdown(f"**Total Value:** ₹{st.session_state.simulation_results['total_value']:,.2f}")
-                st.markdown(f"**Incentive Earned:** ₹{st.session_state.simulation_results['incentive']:,.2f}")
-                
-                if st.session_state.simulation_results['free_item']:
-                    st.markdown(f"<div class='free-item-highlight'>🎁 FREE: {st.session_state.simulation_results['free_item']}</div>", unsafe_allow_html=True)
-                
-                st.markdown("</div>", unsafe_allow_html=True)
+                results = st.session_state.simulation_results
+                st.markdown(card_html(f"Sale to {results['dealer_name']}", {
+                    "Product": results["product_name"],
+                    "Quantity": results["quantity"],
+                    "Total Value": f"₹{results['total_value']:,.2f}",
+                    "Incentive Earned": f"₹{results['incentive']:,.2f}"
+                }, free_item=results["free_item"]), unsafe_allow_html=True)
                 
                 # Customer prompt for free item
                 if st.session_state.simulation_results['free_item']:
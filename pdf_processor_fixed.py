@@ -2,33 +2,121 @@ import os
 import sqlite3
 import json
 import fitz  # PyMuPDF
-import tempfile
 import random
+import numpy as np
 import datetime
 import boto3
+from botocore.config import Config
 from PIL import Image
 import io
 import re
 import uuid
+import queue
+import threading
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache, partial
 import streamlit as st
 
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dns_database.db')
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'secrets.json')
+
+# PRAGMAs applied once to every new connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+# Only meaningful for an on-disk database; skipped for ":memory:"
+FILE_DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA mmap_size=268435456",
+)
+
+READ_POOL_SIZE = 4
+# Prepared statements kept per connection (sqlite3 defaults to 128)
+STATEMENT_CACHE_SIZE = 256
+
+_read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+_write_conn = None
+_write_lock = threading.Lock()
+
+rng = np.random.default_rng()
+
+def apply_connection_pragmas(conn):
+    """Apply the connection PRAGMAs, leaving out file-only ones for in-memory databases"""
+    pragmas = CONNECTION_PRAGMAS if DB_PATH == ":memory:" else FILE_DB_PRAGMAS + CONNECTION_PRAGMAS
+    for pragma in pragmas:
+        conn.execute(pragma)
+
 # Database connection
 def connect_db():
     """Connect to the SQLite database"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(current_dir, 'dns_database.db')
-    conn = sqlite3.connect(db_path)
+    # Autocommit mode: callers open their transactions explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    apply_connection_pragmas(conn)
     return conn
 
-# Create database tables
-def create_tables():
-    """Create all necessary database tables"""
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    # Create schemes table
-    cursor.execute('''
+def _open_pooled_connection(readonly=False):
+    """Open a connection that can be shared across Streamlit's script threads"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    apply_connection_pragmas(conn)
+    if readonly:
+        # Pooled readers must never write; that stays with the single writer
+        conn.execute("PRAGMA query_only=1")
+    return conn
+
+@contextmanager
+def read_connection():
+    """Check a connection out of the read pool and return it when done"""
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        conn = _open_pooled_connection(readonly=True)
+    try:
+        yield conn
+    finally:
+        try:
+            _read_pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+@contextmanager
+def write_connection():
+    """Yield the single shared writer connection, serialising all writers"""
+    global _write_conn
+    with _write_lock:
+        if _write_conn is None:
+            _write_conn = _open_pooled_connection()
+        yield _write_conn
+
+# SQLite's historical default for SQLITE_MAX_VARIABLE_NUMBER; builds since
+# 3.32 allow more, but staying under it keeps bulk_insert portable
+SQLITE_MAX_VARIABLES = 999
+
+def bulk_insert(cursor, table, columns, rows):
+    """Insert rows with multi-row VALUES statements, as many rows per statement as SQLite allows"""
+    if not rows:
+        return
+    row_placeholder = "(" + ", ".join("?" * len(columns)) + ")"
+    column_list = ", ".join(columns)
+    chunk_size = max(1, SQLITE_MAX_VARIABLES // len(columns))
+    for start in range(0, len(rows), chunk_size):
+        batch = rows[start:start + chunk_size]
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) VALUES " + ", ".join([row_placeholder] * len(batch)),
+            [value for row in batch for value in row]
+        )
+
+# Full schema, applied by create_tables as one script; bump SCHEMA_VERSION
+# whenever SCHEMA_SQL changes so existing databases pick the change up
+SCHEMA_VERSION = 4
+SCHEMA_SQL = '''
+    -- Create schemes table
     CREATE TABLE IF NOT EXISTS schemes (
         scheme_id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_name TEXT NOT NULL,
@@ -46,11 +134,9 @@ def create_tables():
         notes TEXT,
         upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create products table
-    cursor.execute('''
+    );
+
+    -- Create products table
     CREATE TABLE IF NOT EXISTS products (
         product_id INTEGER PRIMARY KEY AUTOINCREMENT,
         product_name TEXT NOT NULL,
@@ -68,11 +154,9 @@ def create_tables():
         is_active INTEGER DEFAULT 1,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create scheme_products table (junction table)
-    cursor.execute('''
+    );
+
+    -- Create scheme_products table (junction table)
     CREATE TABLE IF NOT EXISTS scheme_products (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_id INTEGER,
@@ -93,11 +177,9 @@ def create_tables():
         last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (scheme_id) REFERENCES schemes (scheme_id),
         FOREIGN KEY (product_id) REFERENCES products (product_id)
-    )
-    ''')
-    
-    # Create payout_slabs table
-    cursor.execute('''
+    );
+
+    -- Create payout_slabs table
     CREATE TABLE IF NOT EXISTS payout_slabs (
         slab_id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_product_id INTEGER,
@@ -108,11 +190,9 @@ def create_tables():
         total_payout REAL,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (scheme_product_id) REFERENCES scheme_products (id)
-    )
-    ''')
-    
-    # Create scheme_rules table
-    cursor.execute('''
+    );
+
+    -- Create scheme_rules table
     CREATE TABLE IF NOT EXISTS scheme_rules (
         rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_id INTEGER,
@@ -121,11 +201,9 @@ def create_tables():
         rule_value TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (scheme_id) REFERENCES schemes (scheme_id)
-    )
-    ''')
-    
-    # Create scheme_parameters table
-    cursor.execute('''
+    );
+
+    -- Create scheme_parameters table
     CREATE TABLE IF NOT EXISTS scheme_parameters (
         parameter_id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_id INTEGER,
@@ -134,11 +212,9 @@ def create_tables():
         parameter_criteria TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (scheme_id) REFERENCES schemes (scheme_id)
-    )
-    ''')
-    
-    # Create dealers table
-    cursor.execute('''
+    );
+
+    -- Create dealers table
     CREATE TABLE IF NOT EXISTS dealers (
         dealer_id INTEGER PRIMARY KEY AUTOINCREMENT,
         dealer_name TEXT NOT NULL,
@@ -154,11 +230,9 @@ def create_tables():
         is_active INTEGER DEFAULT 1,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create sales_transactions table
-    cursor.execute('''
+    );
+
+    -- Create sales_transactions table
     CREATE TABLE IF NOT EXISTS sales_transactions (
         sale_id INTEGER PRIMARY KEY AUTOINCREMENT,
         dealer_id INTEGER,
@@ -175,11 +249,9 @@ def create_tables():
         FOREIGN KEY (dealer_id) REFERENCES dealers (dealer_id),
         FOREIGN KEY (scheme_id) REFERENCES schemes (scheme_id),
         FOREIGN KEY (product_id) REFERENCES products (product_id)
-    )
-    ''')
-    
-    # Create bundle_offers table
-    cursor.execute('''
+    );
+
+    -- Create bundle_offers table
     CREATE TABLE IF NOT EXISTS bundle_offers (
         bundle_id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_id INTEGER,
@@ -190,11 +262,9 @@ def create_tables():
         FOREIGN KEY (scheme_id) REFERENCES schemes (scheme_id),
         FOREIGN KEY (primary_product_id) REFERENCES products (product_id),
         FOREIGN KEY (bundle_product_id) REFERENCES products (product_id)
-    )
-    ''')
-    
-    # Create scheme_approvals table
-    cursor.execute('''
+    );
+
+    -- Create scheme_approvals table
     CREATE TABLE IF NOT EXISTS scheme_approvals (
         approval_id INTEGER PRIMARY KEY AUTOINCREMENT,
         scheme_id INTEGER,
@@ -204,105 +274,257 @@ def create_tables():
         approved_at TIMESTAMP,
         approval_notes TEXT,
         FOREIGN KEY (scheme_id) REFERENCES schemes (scheme_id)
-    )
-    ''')
+    );
+
+    -- Index the foreign key columns used by joins and per-scheme lookups
+    CREATE INDEX IF NOT EXISTS ix_sales_dealer ON sales_transactions (dealer_id);
+    CREATE INDEX IF NOT EXISTS ix_sales_scheme ON sales_transactions (scheme_id);
+    CREATE INDEX IF NOT EXISTS ix_sales_product ON sales_transactions (product_id);
+    CREATE INDEX IF NOT EXISTS ix_sp_scheme ON scheme_products (scheme_id);
+    CREATE INDEX IF NOT EXISTS ix_sp_product ON scheme_products (product_id);
+    CREATE INDEX IF NOT EXISTS ix_slabs_sp ON payout_slabs (scheme_product_id);
+    CREATE INDEX IF NOT EXISTS ix_rules_scheme ON scheme_rules (scheme_id);
+    
+    -- Covering index for the per-sale payout lookup by scheme and product
+    CREATE INDEX IF NOT EXISTS ix_sp_scheme_product ON scheme_products (scheme_id, product_id, payout_amount);
     
-    conn.commit()
-    conn.close()
+    -- The sales views and dashboard filter on a sale_timestamp range
+    CREATE INDEX IF NOT EXISTS ix_sales_timestamp ON sales_transactions (sale_timestamp);
+    
+    -- Looked up before ingesting a PDF to skip files that were already processed
+    CREATE INDEX IF NOT EXISTS ix_schemes_document_name ON schemes (scheme_document_name);
+    
+    -- A catalogue product is identified by its name and code
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_products_name_code ON products (product_name, product_code);
+'''
+
+# Run before ux_products_name_code is first created on an existing database:
+# products sharing a name and code are merged into the lowest product_id and
+# the rows pointing at the duplicates are moved over to it
+PRODUCT_DEDUPE_SQL = '''
+    CREATE TEMP TABLE product_dedupe AS
+    SELECT p.product_id AS old_id, keep.product_id AS keep_id
+    FROM products p
+    JOIN (
+        SELECT product_name, product_code, MIN(product_id) AS product_id
+        FROM products
+        WHERE product_name IS NOT NULL AND product_code IS NOT NULL
+        GROUP BY product_name, product_code
+        HAVING COUNT(*) > 1
+    ) keep ON keep.product_name = p.product_name AND keep.product_code = p.product_code
+    WHERE p.product_id <> keep.product_id;
+    
+    UPDATE scheme_products SET product_id = (SELECT keep_id FROM product_dedupe WHERE old_id = product_id)
+    WHERE product_id IN (SELECT old_id FROM product_dedupe);
+    UPDATE sales_transactions SET product_id = (SELECT keep_id FROM product_dedupe WHERE old_id = product_id)
+    WHERE product_id IN (SELECT old_id FROM product_dedupe);
+    UPDATE bundle_offers SET primary_product_id = (SELECT keep_id FROM product_dedupe WHERE old_id = primary_product_id)
+    WHERE primary_product_id IN (SELECT old_id FROM product_dedupe);
+    UPDATE bundle_offers SET bundle_product_id = (SELECT keep_id FROM product_dedupe WHERE old_id = bundle_product_id)
+    WHERE bundle_product_id IN (SELECT old_id FROM product_dedupe);
+    DELETE FROM products WHERE product_id IN (SELECT old_id FROM product_dedupe);
+    
+    DROP TABLE product_dedupe;
+'''
+
+# Create database tables
+def create_tables():
+    """Create all necessary database tables"""
+    conn = connect_db()
+    
+    try:
+        # Steady state: the schema is already current, so skip the DDL and its write lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        
+        # An existing catalogue without the unique index may hold duplicate products
+        needs_dedupe = conn.execute("""
+        SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products')
+           AND NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_products_name_code')
+        """).fetchone()[0]
+        
+        # executescript commits any open transaction first, so the transaction
+        # is opened and closed inside the script itself
+        conn.executescript(
+            "BEGIN IMMEDIATE;\n"
+            + (PRODUCT_DEDUPE_SQL if needs_dedupe else "")
+            + SCHEMA_SQL
+            + f"PRAGMA user_version = {SCHEMA_VERSION};\nCOMMIT;"
+        )
+    except sqlite3.Error:
+        # A failed statement leaves the script's transaction open
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
     
     print("All tables created successfully.")
 
+# Connection pool sized for the concurrent Textract workers, with adaptive
+# client-side retries for throttled calls
+AWS_CLIENT_CONFIG = Config(
+    max_pool_connections=16,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
+@lru_cache(maxsize=1)
+def _aws_clients(region, access_key_id, secret_access_key):
+    """Build the Bedrock and Textract clients once per credential set"""
+    session = boto3.Session(
+        region_name=region,
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key
+    )
+    bedrock_client = session.client('bedrock-runtime', config=AWS_CLIENT_CONFIG)
+    textract_client = session.client('textract', config=AWS_CLIENT_CONFIG)
+    return bedrock_client, textract_client
+
 # Initialize AWS clients
 def initialize_aws_clients(secrets):
     """Initialize AWS clients for Bedrock and Textract"""
     try:
-        # Initialize Bedrock client
-        bedrock_client = boto3.client(
-            'bedrock-runtime',
-            region_name=secrets.get('REGION', 'ap-south-1'),
-            aws_access_key_id=secrets.get('aws_access_key_id'),
-            aws_secret_access_key=secrets.get('aws_secret_access_key')
-        )
-        
-        # Initialize Textract client
-        textract_client = boto3.client(
-            'textract',
-            region_name=secrets.get('REGION', 'ap-south-1'),
-            aws_access_key_id=secrets.get('aws_access_key_id'),
-            aws_secret_access_key=secrets.get('aws_secret_access_key')
+        return _aws_clients(
+            secrets.get('REGION', 'ap-south-1'),
+            secrets.get('aws_access_key_id'),
+            secrets.get('aws_secret_access_key')
         )
-        
-        return bedrock_client, textract_client
     except Exception as e:
         print(f"Error initializing AWS clients: {e}")
         return None, None
 
+# Plain text with whitespace kept and ligatures expanded, so "fi"/"fl"
+# glyphs match the extraction regexes; text outside the page box is dropped
+TEXT_EXTRACT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# Textract concurrency and request-rate limits for OCR'd pages
+TEXTRACT_MAX_WORKERS = 3
+TEXTRACT_MAX_RPS = 5
+# A PDF whose first pages all carry this much native text is treated as
+# text-based, and OCR is skipped for the rest of the file
+TEXT_PDF_SAMPLE_PAGES = 3
+TEXT_PDF_MIN_CHARS = 500
+# Raster settings for OCR'd pages; 200 dpi keeps small print legible
+OCR_DPI = 200
+OCR_JPEG_QUALITY = 85
+
+class RateLimiter:
+    """Space calls out to at most `rate` per second across threads"""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+    
+    def wait(self):
+        """Block until the caller may make its next call"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+# Shared by all extractions so concurrent uploads stay under the same cap
+_textract_rate_limiter = RateLimiter(TEXTRACT_MAX_RPS)
+
+def ocr_page_image(textract_client, image_bytes):
+    """Run Textract OCR on one page image and return its text lines"""
+    _textract_rate_limiter.wait()
+    response = textract_client.detect_document_text(
+        Document={'Bytes': image_bytes}
+    )
+    
+    # Extract text from OCR results
+    text_lines = []
+    for block in response.get('Blocks', []):
+        if block['BlockType'] == 'LINE' and 'Text' in block:
+            text_lines.append(block['Text'])
+    
+    return "\n".join(text_lines)
+
 # Extract text from PDF
-def extract_text_from_pdf(file_path, textract_client=None):
-    """Extract text from PDF using PyMuPDF and optionally AWS Textract"""
+def extract_text_from_pdf(file_path, textract_client=None, show_progress=True, max_pages=None):
+    """Extract text from a PDF path or bytes using PyMuPDF and optionally AWS Textract"""
     try:
-        doc = fitz.open(file_path)
-        pages_text = []
+        page_texts = {}
+        ocr_page_nums = []
         
-        # Create a progress placeholder if in Streamlit context
-        processing_message_placeholder = st.empty() if 'st' in globals() else None
-        progress_bar = st.progress(0) if 'st' in globals() else None
+        # Open from memory when given bytes; the with block releases the document
+        if isinstance(file_path, (bytes, bytearray)):
+            doc = fitz.open(stream=file_path, filetype="pdf")
+        else:
+            doc = fitz.open(file_path)
         
-        for page_num in range(len(doc)):
-            if processing_message_placeholder:
-                processing_message_placeholder.write(f"Processing page {page_num + 1}/{len(doc)}...")
+        with doc:
+            # Stop after max_pages; later pages are never parsed or OCR'd
+            page_count = len(doc) if max_pages is None else min(len(doc), max_pages)
             
-            temp_image_path = None
+            # Create a progress placeholder if in Streamlit context; background
+            # workers have no page to draw on and pass show_progress=False
+            processing_message_placeholder = st.empty() if show_progress and 'st' in globals() else None
+            progress_bar = st.progress(0) if show_progress and 'st' in globals() else None
             
-            try:
-                # First try direct text extraction with PyMuPDF
-                page = doc.load_page(page_num)
-                text = page.get_text()
+            # Pass 1: direct text extraction with PyMuPDF, noting pages that need OCR
+            for page_num in range(page_count):
+                if processing_message_placeholder:
+                    processing_message_placeholder.write(f"Processing page {page_num + 1}/{page_count}...")
                 
-                # If text is too short, try OCR with Textract
-                if len(text.strip()) < 100 and textract_client:
-                    # Render page as an image
-                    pix = page.get_pixmap()
-                    temp_image_path = os.path.join(tempfile.gettempdir(), f"page_{page_num}.png")
-                    pix.save(temp_image_path)
+                try:
+                    page = doc.load_page(page_num)
+                    # A page that references no fonts cannot hold text, so its
+                    # (often huge, drawing-only) content stream is not parsed
+                    if page.get_fonts():
+                        page_texts[page_num] = page.get_text("text", flags=TEXT_EXTRACT_FLAGS)
+                    else:
+                        page_texts[page_num] = ""
                     
-                    with open(temp_image_path, "rb") as image_file:
-                        image_bytes = image_file.read()
+                    # If text is too short, try OCR with Textract
+                    if len(page_texts[page_num].strip()) < 100 and textract_client:
+                        ocr_page_nums.append(page_num)
                     
-                    # Use Textract for OCR
-                    try:
-                        response = textract_client.detect_document_text(
-                            Document={'Bytes': image_bytes}
-                        )
-                        
-                        # Extract text from OCR results
-                        text_lines = []
-                        for block in response.get('Blocks', []):
-                            if block['BlockType'] == 'LINE' and 'Text' in block:
-                                text_lines.append(block['Text'])
-                        
-                        text = "\n".join(text_lines)
-                    except Exception as e:
-                        print(f"Textract error on page {page_num + 1}: {str(e)}")
-                        # Fall back to PyMuPDF text
+                    # Once the sample pages are read, decide whether the file is text-based
+                    if textract_client and page_num == min(TEXT_PDF_SAMPLE_PAGES, page_count) - 1:
+                        sample = range(page_num + 1)
+                        if all(len(page_texts.get(i, "")) > TEXT_PDF_MIN_CHARS for i in sample):
+                            textract_client = None
+                            if show_progress and 'st' in globals():
+                                st.info("Detected text-based PDF; skipping OCR")
                 
-                pages_text.append((page_num + 1, text, text))
-            
-            except Exception as e:
-                if 'st' in globals():
-                    st.error(f"Error processing page {page_num + 1}: {str(e)}")
-                else:
-                    print(f"Error processing page {page_num + 1}: {str(e)}")
-                continue
-            
-            finally:
-                if temp_image_path and os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
+                except Exception as e:
+                    if 'st' in globals():
+                        st.error(f"Error processing page {page_num + 1}: {str(e)}")
+                    else:
+                        print(f"Error processing page {page_num + 1}: {str(e)}")
+                    continue
+                
+                if progress_bar:
+                    progress_bar.progress((page_num + 1) / page_count)
             
-            if progress_bar:
-                progress_bar.progress((page_num + 1) / len(doc))
+            # Pass 2: rasterize OCR pages here (the document is not thread-safe)
+            # while earlier pages are already in flight to Textract
+            if ocr_page_nums:
+                with ThreadPoolExecutor(max_workers=TEXTRACT_MAX_WORKERS) as executor:
+                    futures = {}
+                    for page_num in ocr_page_nums:
+                        try:
+                            # Render page as a grayscale JPEG in memory; far cheaper
+                            # to encode than PNG and all Textract needs for text
+                            pix = doc.load_page(page_num).get_pixmap(colorspace=fitz.csGRAY, dpi=OCR_DPI)
+                            image_bytes = pix.tobytes(output="jpeg", jpg_quality=OCR_JPEG_QUALITY)
+                            
+                            futures[executor.submit(ocr_page_image, textract_client, image_bytes)] = page_num
+                        except Exception as e:
+                            print(f"Error rendering page {page_num + 1} for OCR: {str(e)}")
+                    
+                    for future in as_completed(futures):
+                        page_num = futures[future]
+                        try:
+                            page_texts[page_num] = future.result()
+                        except Exception as e:
+                            print(f"Textract error on page {page_num + 1}: {str(e)}")
+                            # Fall back to PyMuPDF text
         
-        return pages_text
+        return [(page_num + 1, text) for page_num, text in sorted(page_texts.items())]
     
     except Exception as e:
         if 'st' in globals():
@@ -317,18 +539,23 @@ def normalize_field(field, field_type=str, default=None):
     if field is None:
         return default
     
+    # Fast path: most extracted values already have the target type
+    value_type = type(field)
+    if value_type is field_type:
+        return field
+    
     try:
         # Handle lists by joining with comma
-        if isinstance(field, list):
-            if field_type == str:
+        if value_type is list:
+            if field_type is str:
                 return ', '.join(str(item) for item in field)
-            elif field_type == float or field_type == int:
+            elif field_type is float or field_type is int:
                 # For numeric types, take the first item if available
                 return field_type(field[0]) if field else default
         
         # Handle dictionaries by converting to JSON string
-        if isinstance(field, dict):
-            if field_type == str:
+        elif value_type is dict:
+            if field_type is str:
                 return json.dumps(field)
             else:
                 return default
@@ -338,52 +565,120 @@ def normalize_field(field, field_type=str, default=None):
     except (ValueError, TypeError):
         return default
 
+def normalize_record(record, fields):
+    """Normalize a record's fields in schema order, calling callable defaults only when needed"""
+    get = record.get
+    values = []
+    for key, field_type, default in fields:
+        value = normalize_field(get(key), field_type)
+        if value is None:
+            value = default() if callable(default) else default
+        values.append(value)
+    return values
+
+# Extracted field schemas as (key, type, default); product and rule keys are also
+# the column names they are inserted into
+PRODUCT_FIELDS = (
+    ('product_name', str, lambda: f"Product {uuid.uuid4().hex[:8]}"),
+    ('product_code', str, lambda: f"CODE-{uuid.uuid4().hex[:8]}"),
+    ('product_category', str, 'Mobile'),
+    ('product_subcategory', str, 'Other'),
+    ('ram', str, None),
+    ('storage', str, None),
+    ('connectivity', str, None),
+    ('dealer_price_dp', float, lambda: random.randint(10000, 100000)),
+    ('mrp', float, lambda: random.randint(15000, 120000))
+)
+
+# support_type and total_payout default to other values, so they are filled in separately
+SCHEME_PRODUCT_FIELDS = (
+    ('payout_type', str, 'Fixed'),
+    ('payout_amount', float, 1000.0),
+    ('payout_unit', str, 'INR'),
+    ('dealer_contribution', float, 0.0),
+    ('bundle_price', float, None),
+    ('free_item_description', str, None)
+)
+
+# Boolean flags as (key, default), stored as 0/1
+SCHEME_PRODUCT_FLAGS = (
+    ('is_dealer_incentive', True),
+    ('is_bundle_offer', False),
+    ('is_upgrade_offer', False),
+    ('is_slab_based', False)
+)
+
+RULE_FIELDS = (
+    ('rule_type', str, 'General'),
+    ('rule_description', str, 'No description'),
+    ('rule_value', str, None)
+)
+
+# Bedrock extraction prompt, filled in per document with str.format; the
+# document text itself is sent as its own content block after it
+EXTRACTION_PROMPT = """
+You are a specialized AI for extracting structured data from mobile phone scheme documents.
+
+Document: {document_name}
+
+Extract the following information in JSON format:
+1. scheme_name: The name of the scheme
+2. scheme_type: Type of scheme (e.g., Special Support, RCM, Upgrade Program)
+3. scheme_period_start: Start date in YYYY-MM-DD format
+4. scheme_period_end: End date in YYYY-MM-DD format
+5. applicable_region: Region where the scheme is applicable
+6. dealer_type_eligibility: Types of dealers eligible for this scheme
+7. products: Array of products with these fields:
+   - product_name: Full name of the product
+   - product_code: Product code if available
+   - product_category: Category (e.g., Mobile, Tablet)
+   - product_subcategory: Subcategory (e.g., S Series, A Series)
+   - ram: RAM specification if available
+   - storage: Storage specification if available
+   - connectivity: Connectivity options if available
+   - support_type: Type of support (e.g., Cashback, Exchange)
+   - payout_type: Type of payout (Fixed, Percentage)
+   - payout_amount: Amount of payout
+   - payout_unit: Unit of payout (e.g., INR, %)
+   - dealer_contribution: Dealer's contribution if any
+   - total_payout: Total payout amount
+   - is_bundle_offer: Boolean indicating if it's a bundle offer
+   - bundle_price: Price of the bundle if applicable
+   - is_upgrade_offer: Boolean indicating if it's an upgrade offer
+   - free_item_description: Description of any free items included with the product (e.g., "Galaxy Buds2 Pro", "Galaxy Watch4", etc.)
+8. scheme_rules: Array of rules with these fields:
+   - rule_type: Type of rule
+   - rule_description: Description of the rule
+   - rule_value: Value or threshold for the rule
+
+Here's the document text:
+"""
+EXTRACTION_PROMPT_FOOTER = "Return only the JSON object without any additional text."
+# Longer texts keep their head and tail; scheme terms sit at the start
+# and the conditions usually at the end
+MAX_PROMPT_TEXT_CHARS = 60000
+# Strips an optional ```json fence around the model's reply
+JSON_BLOCK_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+
+# Where extract_structured_data_with_source got its result from
+EXTRACTION_SOURCE_MODEL = 'bedrock'
+EXTRACTION_SOURCE_RULES = 'rule_based'
+
 # Extract structured data from text
 def extract_structured_data_from_text(text, document_name, bedrock_client=None, inference_profile_arn=None):
     """Extract structured data from text using Claude API or fallback to rule-based extraction"""
+    return extract_structured_data_with_source(text, document_name, bedrock_client, inference_profile_arn)[0]
+
+def extract_structured_data_with_source(text, document_name, bedrock_client=None, inference_profile_arn=None):
+    """Extract structured data from text, returning (structured_data, source) with source None on failure"""
     try:
         # If Bedrock client is available, use Claude API
         if bedrock_client and inference_profile_arn:
-            prompt = f"""
-            You are a specialized AI for extracting structured data from mobile phone scheme documents.
-            
-            Document: {document_name}
-            
-            Extract the following information in JSON format:
-            1. scheme_name: The name of the scheme
-            2. scheme_type: Type of scheme (e.g., Special Support, RCM, Upgrade Program)
-            3. scheme_period_start: Start date in YYYY-MM-DD format
-            4. scheme_period_end: End date in YYYY-MM-DD format
-            5. applicable_region: Region where the scheme is applicable
-            6. dealer_type_eligibility: Types of dealers eligible for this scheme
-            7. products: Array of products with these fields:
-               - product_name: Full name of the product
-               - product_code: Product code if available
-               - product_category: Category (e.g., Mobile, Tablet)
-               - product_subcategory: Subcategory (e.g., S Series, A Series)
-               - ram: RAM specification if available
-               - storage: Storage specification if available
-               - connectivity: Connectivity options if available
-               - support_type: Type of support (e.g., Cashback, Exchange)
-               - payout_type: Type of payout (Fixed, Percentage)
-               - payout_amount: Amount of payout
-               - payout_unit: Unit of payout (e.g., INR, %)
-               - dealer_contribution: Dealer's contribution if any
-               - total_payout: Total payout amount
-               - is_bundle_offer: Boolean indicating if it's a bundle offer
-               - bundle_price: Price of the bundle if applicable
-               - is_upgrade_offer: Boolean indicating if it's an upgrade offer
-               - free_item_description: Description of any free items included with the product (e.g., "Galaxy Buds2 Pro", "Galaxy Watch4", etc.)
-            8. scheme_rules: Array of rules with these fields:
-               - rule_type: Type of rule
-               - rule_description: Description of the rule
-               - rule_value: Value or threshold for the rule
-            
-            Here's the document text:
-            {text}
-            
-            Return only the JSON object without any additional text.
-            """
+            prompt = EXTRACTION_PROMPT.format(document_name=document_name)
+            prompt_text = text
+            if len(text) > MAX_PROMPT_TEXT_CHARS:
+                half = MAX_PROMPT_TEXT_CHARS // 2
+                prompt_text = text[:half] + "\n...\n" + text[-half:]
             
             payload = {
                 "anthropic_version": "bedrock-2023-05-31",
@@ -391,7 +686,11 @@ def extract_structured_data_from_text(text, document_name, bedrock_client=None,
                 "messages": [
                     {
                         "role": "user",
-                        "content": prompt
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {"type": "text", "text": prompt_text},
+                            {"type": "text", "text": EXTRACTION_PROMPT_FOOTER}
+                        ]
                     }
                 ]
             }
@@ -407,24 +706,56 @@ def extract_structured_data_from_text(text, document_name, bedrock_client=None,
                 result_text = response_body['content'][0]['text'].strip()
                 
                 # Extract JSON from response
-                json_match = re.search(r'```json\s*(.*?)\s*```', result_text, re.DOTALL)
+                json_match = JSON_BLOCK_RE.search(result_text)
                 if json_match:
                     result_text = json_match.group(1)
                 
                 # Parse JSON
                 structured_data = json.loads(result_text)
-                return structured_data
+                return structured_data, EXTRACTION_SOURCE_MODEL
             
             except Exception as e:
                 print(f"Error calling Claude API: {e}")
                 # Fall back to rule-based extraction
         
         # Rule-based extraction as fallback
-        return rule_based_extraction(text, document_name)
+        return rule_based_extraction(text, document_name), EXTRACTION_SOURCE_RULES
     
     except Exception as e:
         print(f"Error extracting structured data: {e}")
-        return None
+        return None, None
+
+# Patterns used by the rule-based fallback, compiled once at import
+DATE_RE = re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')
+# Default free items based on scheme type
+DEFAULT_FREE_ITEMS = {
+    "Bundle Offer": "Galaxy Buds2 Pro",
+    "Upgrade Program": "Galaxy Watch4"
+}
+# Scheme-type, region and dealer-type keywords, collected in one scan
+KEYWORD_RE = re.compile(r'RCM|Upgrade|Bundle|North|South|East|West|MBO|GT|SEZ|Blue Wave')
+# Day-first formats are tried before month-first ones
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%m/%d/%Y", "%m-%d-%Y")
+# Model and free-item alternatives are combined so the text is scanned once per category
+MODEL_RE = re.compile(
+    r'(Galaxy [A-Za-z0-9]+'  # e.g., Galaxy S21, Galaxy Tab
+    r'|Tab [A-Za-z0-9]+'  # e.g., Tab S7
+    r'|[A-Z]\d+[A-Z]?)'  # e.g., S21, A52s
+)
+AMOUNT_RE = re.compile(r'(?:Rs\.?|INR)\s*(\d{1,3}(?:,\d{3})*(?:\.\d{1,2})?)')
+FREE_ITEM_RE = re.compile(
+    r'(?:free|complimentary|included)\s+([A-Za-z0-9\s]+(?:Buds|Watch|Headphone|Earphone|Charger|Cover|Case|Adapter)[A-Za-z0-9\s]*)',
+    re.IGNORECASE
+)
+
+def parse_date(value, default):
+    """Convert a matched date to YYYY-MM-DD, or return default if no format fits"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return default
 
 # Rule-based extraction fallback
 def rule_based_extraction(text, document_name):
@@ -434,114 +765,79 @@ def rule_based_extraction(text, document_name):
     if '.' in scheme_name:
         scheme_name = ' '.join(scheme_name.split('.')[1:]).strip()
     
+    # Keywords present anywhere in the text
+    keywords = set(KEYWORD_RE.findall(text))
+    
     # Extract scheme type based on keywords
     scheme_type = "Special Support"  # Default
-    if "RCM" in document_name or "RCM" in text:
+    if "RCM" in document_name or "RCM" in keywords:
         scheme_type = "RCM"
-    elif "Upgrade Program" in document_name or "Upgrade" in text:
+    elif "Upgrade Program" in document_name or "Upgrade" in keywords:
         scheme_type = "Upgrade Program"
-    elif "Bundle" in document_name or "Bundle" in text:
+    elif "Bundle" in document_name or "Bundle" in keywords:
         scheme_type = "Bundle Offer"
     
     # Extract dates (simple pattern matching)
-    date_pattern = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-    dates = re.findall(date_pattern, text)
+    dates = DATE_RE.findall(text)
     
     scheme_period_start = "2023-01-01"  # Default
     scheme_period_end = "2023-12-31"    # Default
     
     if len(dates) >= 2:
-        # Convert to YYYY-MM-DD format (assuming DD/MM/YYYY or MM/DD/YYYY input)
-        try:
-            start_date = dates[0]
-            end_date = dates[1]
-            
-            # Handle different date formats
-            if '/' in start_date:
-                parts = start_date.split('/')
-                if len(parts[2]) == 2:
-                    parts[2] = '20' + parts[2]
-                scheme_period_start = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-            elif '-' in start_date:
-                parts = start_date.split('-')
-                if len(parts[2]) == 2:
-                    parts[2] = '20' + parts[2]
-                scheme_period_start = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-            
-            if '/' in end_date:
-                parts = end_date.split('/')
-                if len(parts[2]) == 2:
-                    parts[2] = '20' + parts[2]
-                scheme_period_end = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-            elif '-' in end_date:
-                parts = end_date.split('-')
-                if len(parts[2]) == 2:
-                    parts[2] = '20' + parts[2]
-                scheme_period_end = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-        except:
-            # Keep defaults if parsing fails
-            pass
+        scheme_period_start = parse_date(dates[0], scheme_period_start)
+        scheme_period_end = parse_date(dates[1], scheme_period_end)
     
     # Extract region
     region = "All India"  # Default
-    if "North" in text and "East" in text:
+    if {"North", "East"} <= keywords:
         region = "North and East"
-    elif "South" in text and "West" in text:
+    elif {"South", "West"} <= keywords:
         region = "South and West"
-    elif "North" in text:
+    elif "North" in keywords:
         region = "North"
-    elif "South" in text:
+    elif "South" in keywords:
         region = "South"
-    elif "East" in text:
+    elif "East" in keywords:
         region = "East"
-    elif "West" in text:
+    elif "West" in keywords:
         region = "West"
     
     # Extract dealer eligibility
     dealer_type = "All Dealers"  # Default
-    if "MBO" in text:
+    if "MBO" in keywords:
         dealer_type = "MBO"
-    elif "GT" in text:
+    elif "GT" in keywords:
         dealer_type = "GT"
-    elif "SEZ" in text and "Blue Wave" in text:
+    elif {"SEZ", "Blue Wave"} <= keywords:
         dealer_type = "SEZ and Blue Wave"
     
     # Extract products (simplified)
     products = []
     
     # Look for product models
-    model_patterns = [
-        r'([A-Z]\d+[A-Z]?)',  # e.g., S21, A52s
-        r'(Galaxy [A-Za-z0-9]+)',  # e.g., Galaxy S21, Galaxy Tab
-        r'(Tab [A-Za-z0-9]+)'  # e.g., Tab S7
-    ]
-    
-    found_models = set()
-    for pattern in model_patterns:
-        matches = re.findall(pattern, text)
-        found_models.update(matches)
+    found_models = set(MODEL_RE.findall(text))
     
     # Extract amounts (potential payouts)
-    amount_pattern = r'(?:Rs\.?|INR)\s*(\d{1,3}(?:,\d{3})*(?:\.\d{1,2})?)'
-    amounts = re.findall(amount_pattern, text)
+    amounts = AMOUNT_RE.findall(text)
     
     # Look for free items
-    free_item_patterns = [
-        r'free\s+([A-Za-z0-9\s]+(?:Buds|Watch|Headphone|Earphone|Charger|Cover|Case|Adapter)[A-Za-z0-9\s]*)',
-        r'complimentary\s+([A-Za-z0-9\s]+(?:Buds|Watch|Headphone|Earphone|Charger|Cover|Case|Adapter)[A-Za-z0-9\s]*)',
-        r'included\s+([A-Za-z0-9\s]+(?:Buds|Watch|Headphone|Earphone|Charger|Cover|Case|Adapter)[A-Za-z0-9\s]*)'
-    ]
+    free_items = FREE_ITEM_RE.findall(text)
     
-    free_items = []
-    for pattern in free_item_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        free_items.extend(matches)
+    # Resolve everything that depends only on the scheme type once, outside the product loop
+    default_free_item = DEFAULT_FREE_ITEMS.get(scheme_type)
+    is_bundle_offer = scheme_type == "Bundle Offer"
+    is_upgrade_offer = scheme_type == "Upgrade Program"
     
-    # Default free items based on scheme type
-    default_free_items = {
-        "Bundle Offer": "Galaxy Buds2 Pro",
-        "Upgrade Program": "Galaxy Watch4"
-    }
+    # Draw the placeholder specs for every product at once; tolist() keeps
+    # the values plain Python types for JSON and SQLite
+    product_count = len(found_models)
+    rams = rng.choice([4, 6, 8, 12], size=product_count).tolist()
+    storages = rng.choice([64, 128, 256, 512], size=product_count).tolist()
+    connectivities = rng.choice(["4G", "5G", "4G/5G"], size=product_count).tolist()
+    code_suffixes = rng.integers(1000, 10000, size=product_count).tolist()
+    fallback_payouts = rng.integers(500, 5001, size=product_count).tolist()
+    if default_free_item:
+        default_free_item_flips = (rng.random(product_count) > 0.5).tolist()  # 50% chance for default free item
     
     # Create product entries
     for i, model in enumerate(found_models):
@@ -549,26 +845,28 @@ def rule_based_extraction(text, document_name):
         free_item = None
         if i < len(free_items):
             free_item = free_items[i].strip()
-        elif scheme_type in default_free_items and random.random() > 0.5:  # 50% chance for default free item
-            free_item = default_free_items[scheme_type]
+        elif default_free_item and default_free_item_flips[i]:
+            free_item = default_free_item
+        
+        payout = float(amounts[i].replace(',', '')) if i < len(amounts) else fallback_payouts[i]
         
         product = {
             "product_name": model,
-            "product_code": f"CODE-{model.replace(' ', '')}-{random.randint(1000, 9999)}",
+            "product_code": f"CODE-{model.replace(' ', '')}-{code_suffixes[i]}",
             "product_category": "Mobile" if "Tab" not in model else "Tablet",
             "product_subcategory": model[0] + " Series" if model[0].isalpha() else "Other",
-            "ram": f"{random.choice([4, 6, 8, 12])}GB",
-            "storage": f"{random.choice([64, 128, 256, 512])}GB",
-            "connectivity": random.choice(["4G", "5G", "4G/5G"]),
+            "ram": f"{rams[i]}GB",
+            "storage": f"{storages[i]}GB",
+            "connectivity": connectivities[i],
             "support_type": scheme_type,
             "payout_type": "Fixed",
-            "payout_amount": float(amounts[i].replace(',', '')) if i < len(amounts) else random.randint(500, 5000),
+            "payout_amount": payout,
             "payout_unit": "INR",
             "dealer_contribution": 0,
-            "total_payout": float(amounts[i].replace(',', '')) if i < len(amounts) else random.randint(500, 5000),
-            "is_bundle_offer": scheme_type == "Bundle Offer",
+            "total_payout": payout,
+            "is_bundle_offer": is_bundle_offer,
             "bundle_price": None,
-            "is_upgrade_offer": scheme_type == "Upgrade Program",
+            "is_upgrade_offer": is_upgrade_offer,
             "free_item_description": free_item
         }
         products.append(product)
@@ -581,8 +879,8 @@ def rule_based_extraction(text, document_name):
         free_item = None
         if free_items:
             free_item = free_items[0].strip()
-        elif scheme_type in default_free_items and random.random() > 0.5:  # 50% chance for default free item
-            free_item = default_free_items[scheme_type]
+        elif default_free_item and random.random() > 0.5:  # 50% chance for default free item
+            free_item = default_free_item
         
         products.append({
             "product_name": default_model,
@@ -598,9 +896,9 @@ def rule_based_extraction(text, document_name):
             "payout_unit": "INR",
             "dealer_contribution": 0,
             "total_payout": 2000.0,
-            "is_bundle_offer": scheme_type == "Bundle Offer",
+            "is_bundle_offer": is_bundle_offer,
             "bundle_price": None,
-            "is_upgrade_offer": scheme_type == "Upgrade Program",
+            "is_upgrade_offer": is_upgrade_offer,
             "free_item_description": free_item
         })
     
@@ -638,251 +936,329 @@ def add_sample_data():
     conn = connect_db()
     cursor = conn.cursor()
     
-    # Check if we already have data
-    cursor.execute("SELECT COUNT(*) FROM dealers")
-    dealer_count = cursor.fetchone()[0]
+    # Check if we already have data; EXISTS stops at the first row instead of counting them all
+    seed_check = """
+    SELECT EXISTS (SELECT 1 FROM dealers) AS has_dealers,
+           EXISTS (SELECT 1 FROM products) AS has_products,
+           EXISTS (SELECT 1 FROM schemes) AS has_schemes
+    """
     
-    cursor.execute("SELECT COUNT(*) FROM products")
-    product_count = cursor.fetchone()[0]
+    # Most calls find an already seeded database, so return before taking the write lock
+    cursor.execute(seed_check)
+    existing = cursor.fetchone()
+    if existing["has_dealers"] and (existing["has_products"] or existing["has_schemes"]):
+        conn.close()
+        return
     
-    cursor.execute("SELECT COUNT(*) FROM schemes")
-    scheme_count = cursor.fetchone()[0]
+    # One transaction for the whole seed
+    cursor.execute("BEGIN IMMEDIATE")
     
-    # Add sample dealers if none exist
-    if dealer_count == 0:
-        dealers = [
-            ('Reliance Digital', 'RD001', 'National Chain', 'North', 'Delhi', 'New Delhi'),
-            ('Croma', 'CR001', 'National Chain', 'West', 'Maharashtra', 'Mumbai'),
-            ('Vijay Sales', 'VS001', 'Regional Chain', 'West', 'Maharashtra', 'Mumbai'),
-            ('Sangeetha Mobiles', 'SM001', 'Regional Chain', 'South', 'Karnataka', 'Bangalore'),
-            ('The Mobile Store', 'TMS001', 'MBO', 'South', 'Tamil Nadu', 'Chennai'),
-            ('Poorvika Mobiles', 'PM001', 'Regional Chain', 'South', 'Tamil Nadu', 'Chennai'),
-            ('Bajaj Electronics', 'BE001', 'Regional Chain', 'South', 'Telangana', 'Hyderabad'),
-            ('Great Eastern', 'GE001', 'Regional Chain', 'East', 'West Bengal', 'Kolkata'),
-            ('Tata Croma', 'TC001', 'National Chain', 'North', 'Uttar Pradesh', 'Lucknow'),
-            ('Mobile World', 'MW001', 'MBO', 'South', 'Karnataka', 'Bangalore')
-        ]
+    try:
+        # Check again under the lock in case another process seeded in the meantime
+        cursor.execute(seed_check)
+        existing = cursor.fetchone()
         
-        for dealer in dealers:
-            cursor.execute('''
+        # Add sample dealers if none exist
+        if not existing["has_dealers"]:
+            dealers = [
+                ('Reliance Digital', 'RD001', 'National Chain', 'North', 'Delhi', 'New Delhi'),
+                ('Croma', 'CR001', 'National Chain', 'West', 'Maharashtra', 'Mumbai'),
+                ('Vijay Sales', 'VS001', 'Regional Chain', 'West', 'Maharashtra', 'Mumbai'),
+                ('Sangeetha Mobiles', 'SM001', 'Regional Chain', 'South', 'Karnataka', 'Bangalore'),
+                ('The Mobile Store', 'TMS001', 'MBO', 'South', 'Tamil Nadu', 'Chennai'),
+                ('Poorvika Mobiles', 'PM001', 'Regional Chain', 'South', 'Tamil Nadu', 'Chennai'),
+                ('Bajaj Electronics', 'BE001', 'Regional Chain', 'South', 'Telangana', 'Hyderabad'),
+                ('Great Eastern', 'GE001', 'Regional Chain', 'East', 'West Bengal', 'Kolkata'),
+                ('Tata Croma', 'TC001', 'National Chain', 'North', 'Uttar Pradesh', 'Lucknow'),
+                ('Mobile World', 'MW001', 'MBO', 'South', 'Karnataka', 'Bangalore')
+            ]
+            
+            cursor.executemany('''
             INSERT INTO dealers (
                 dealer_name, dealer_code, dealer_type, region, state, city
             ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', dealer)
-        
-        print("Sample dealers added successfully.")
-    
-    # Add sample products and schemes if none exist
-    if product_count == 0 and scheme_count == 0:
-        # Add sample products
-        products = [
-            ('Samsung Galaxy S23 Ultra', 'SM-S918B', 'Mobile', 'S Series', '12GB', '512GB', '5G', 'Phantom Black', '6.8"', 'Snapdragon 8 Gen 2', 124999.0, 149999.0),
-            ('Samsung Galaxy S23+', 'SM-S916B', 'Mobile', 'S Series', '8GB', '256GB', '5G', 'Cream', '6.6"', 'Snapdragon 8 Gen 2', 94999.0, 109999.0),
-            ('Samsung Galaxy S23', 'SM-S911B', 'Mobile', 'S Series', '8GB', '128GB', '5G', 'Green', '6.1"', 'Snapdragon 8 Gen 2', 74999.0, 89999.0),
-            ('Samsung Galaxy S21 FE', 'SM-G990B', 'Mobile', 'S Series', '8GB', '128GB', '5G', 'Olive', '6.4"', 'Exynos 2100', 49999.0, 54999.0),
-            ('Samsung Galaxy A54', 'SM-A546B', 'Mobile', 'A Series', '8GB', '128GB', '5G', 'Awesome Violet', '6.4"', 'Exynos 1380', 38999.0, 44999.0),
-            ('Samsung Galaxy A34', 'SM-A346B', 'Mobile', 'A Series', '8GB', '128GB', '5G', 'Awesome Silver', '6.6"', 'Dimensity 1080', 30999.0, 36999.0),
-            ('Samsung Galaxy A14', 'SM-A145F', 'Mobile', 'A Series', '4GB', '64GB', '4G', 'Black', '6.6"', 'Helio G80', 13999.0, 16999.0),
-            ('Samsung Galaxy M34', 'SM-M346B', 'Mobile', 'M Series', '6GB', '128GB', '5G', 'Midnight Blue', '6.5"', 'Exynos 1280', 18999.0, 24999.0),
-            ('Samsung Galaxy M14', 'SM-M146B', 'Mobile', 'M Series', '4GB', '64GB', '4G', 'Berry Blue', '6.6"', 'Exynos 850', 13499.0, 15999.0),
-            ('Samsung Galaxy F54', 'SM-E546B', 'Mobile', 'F Series', '8GB', '256GB', '5G', 'Stardust Silver', '6.7"', 'Dimensity 1080', 29999.0, 35999.0),
-            ('Samsung Galaxy F14', 'SM-E146B', 'Mobile', 'F Series', '4GB', '128GB', '5G', 'GOAT Green', '6.6"', 'Exynos 1330', 14999.0, 17999.0),
-            ('Samsung Galaxy Tab S9 Ultra', 'SM-X916B', 'Tablet', 'Tab S Series', '12GB', '256GB', '5G', 'Graphite', '14.6"', 'Snapdragon 8 Gen 2', 109999.0, 129999.0),
-            ('Samsung Galaxy Tab S9+', 'SM-X816B', 'Tablet', 'Tab S Series', '12GB', '256GB', '5G', 'Beige', '12.4"', 'Snapdragon 8 Gen 2', 89999.0, 109999.0),
-            ('Samsung Galaxy Tab S9', 'SM-X716B', 'Tablet', 'Tab S Series', '8GB', '128GB', '5G', 'Graphite', '11"', 'Snapdragon 8 Gen 2', 74999.0, 89999.0),
-            ('Samsung Galaxy Tab A9+', 'SM-X216B', 'Tablet', 'Tab A Series', '8GB', '128GB', '4G', 'Silver', '11"', 'Snapdragon 695', 24999.0, 29999.0),
-            ('Samsung Galaxy Tab A9', 'SM-X116B', 'Tablet', 'Tab A Series', '4GB', '64GB', '4G', 'Gray', '8.7"', 'Helio G99', 15999.0, 19999.0),
-            ('Samsung Galaxy Book3 Pro 360', 'NP960QFG', 'Laptop', 'Galaxy Book Series', '16GB', '512GB', 'Wi-Fi', 'Graphite', '16"', 'Intel Core i7-13700H', 159999.0, 179999.0),
-            ('Samsung Galaxy Book3 Pro', 'NP940XFG', 'Laptop', 'Galaxy Book Series', '16GB', '512GB', 'Wi-Fi', 'Beige', '14"', 'Intel Core i7-13700H', 139999.0, 159999.0),
-            ('Samsung Galaxy Book3', 'NP750XFG', 'Laptop', 'Galaxy Book Series', '8GB', '256GB', 'Wi-Fi', 'Silver', '15.6"', 'Intel Core i5-1335U', 74999.0, 89999.0),
-            ('Samsung Galaxy Watch6 Classic', 'SM-R960', 'Wearable', 'Watch Series', '2GB', '16GB', 'Bluetooth/LTE', 'Black', '1.5"', 'Exynos W930', 36999.0, 44999.0),
-            ('Samsung Galaxy Watch6', 'SM-R930', 'Wearable', 'Watch Series', '2GB', '16GB', 'Bluetooth/LTE', 'Gold', '1.3"', 'Exynos W930', 29999.0, 36999.0),
-            ('Samsung Galaxy Buds3 Pro', 'SM-R630', 'Audio', 'Buds Series', None, None, 'Bluetooth', 'White', None, None, 16999.0, 19999.0),
-            ('Samsung Galaxy Buds3', 'SM-R530', 'Audio', 'Buds Series', None, None, 'Bluetooth', 'Graphite', None, None, 12999.0, 14999.0)
-        ]
+            ''', dealers)
+            
+            print("Sample dealers added successfully.")
         
-        for product in products:
-            cursor.execute('''
+        # Add sample products and schemes if none exist
+        if not existing["has_products"] and not existing["has_schemes"]:
+            # Add sample products
+            products = [
+                ('Samsung Galaxy S23 Ultra', 'SM-S918B', 'Mobile', 'S Series', '12GB', '512GB', '5G', 'Phantom Black', '6.8"', 'Snapdragon 8 Gen 2', 124999.0, 149999.0),
+                ('Samsung Galaxy S23+', 'SM-S916B', 'Mobile', 'S Series', '8GB', '256GB', '5G', 'Cream', '6.6"', 'Snapdragon 8 Gen 2', 94999.0, 109999.0),
+                ('Samsung Galaxy S23', 'SM-S911B', 'Mobile', 'S Series', '8GB', '128GB', '5G', 'Green', '6.1"', 'Snapdragon 8 Gen 2', 74999.0, 89999.0),
+                ('Samsung Galaxy S21 FE', 'SM-G990B', 'Mobile', 'S Series', '8GB', '128GB', '5G', 'Olive', '6.4"', 'Exynos 2100', 49999.0, 54999.0),
+                ('Samsung Galaxy A54', 'SM-A546B', 'Mobile', 'A Series', '8GB', '128GB', '5G', 'Awesome Violet', '6.4"', 'Exynos 1380', 38999.0, 44999.0),
+                ('Samsung Galaxy A34', 'SM-A346B', 'Mobile', 'A Series', '8GB', '128GB', '5G', 'Awesome Silver', '6.6"', 'Dimensity 1080', 30999.0, 36999.0),
+                ('Samsung Galaxy A14', 'SM-A145F', 'Mobile', 'A Series', '4GB', '64GB', '4G', 'Black', '6.6"', 'Helio G80', 13999.0, 16999.0),
+                ('Samsung Galaxy M34', 'SM-M346B', 'Mobile', 'M Series', '6GB', '128GB', '5G', 'Midnight Blue', '6.5"', 'Exynos 1280', 18999.0, 24999.0),
+                ('Samsung Galaxy M14', 'SM-M146B', 'Mobile', 'M Series', '4GB', '64GB', '4G', 'Berry Blue', '6.6"', 'Exynos 850', 13499.0, 15999.0),
+                ('Samsung Galaxy F54', 'SM-E546B', 'Mobile', 'F Series', '8GB', '256GB', '5G', 'Stardust Silver', '6.7"', 'Dimensity 1080', 29999.0, 35999.0),
+                ('Samsung Galaxy F14', 'SM-E146B', 'Mobile', 'F Series', '4GB', '128GB', '5G', 'GOAT Green', '6.6"', 'Exynos 1330', 14999.0, 17999.0),
+                ('Samsung Galaxy Tab S9 Ultra', 'SM-X916B', 'Tablet', 'Tab S Series', '12GB', '256GB', '5G', 'Graphite', '14.6"', 'Snapdragon 8 Gen 2', 109999.0, 129999.0),
+                ('Samsung Galaxy Tab S9+', 'SM-X816B', 'Tablet', 'Tab S Series', '12GB', '256GB', '5G', 'Beige', '12.4"', 'Snapdragon 8 Gen 2', 89999.0, 109999.0),
+                ('Samsung Galaxy Tab S9', 'SM-X716B', 'Tablet', 'Tab S Series', '8GB', '128GB', '5G', 'Graphite', '11"', 'Snapdragon 8 Gen 2', 74999.0, 89999.0),
+                ('Samsung Galaxy Tab A9+', 'SM-X216B', 'Tablet', 'Tab A Series', '8GB', '128GB', '4G', 'Silver', '11"', 'Snapdragon 695', 24999.0, 29999.0),
+                ('Samsung Galaxy Tab A9', 'SM-X116B', 'Tablet', 'Tab A Series', '4GB', '64GB', '4G', 'Gray', '8.7"', 'Helio G99', 15999.0, 19999.0),
+                ('Samsung Galaxy Book3 Pro 360', 'NP960QFG', 'Laptop', 'Galaxy Book Series', '16GB', '512GB', 'Wi-Fi', 'Graphite', '16"', 'Intel Core i7-13700H', 159999.0, 179999.0),
+                ('Samsung Galaxy Book3 Pro', 'NP940XFG', 'Laptop', 'Galaxy Book Series', '16GB', '512GB', 'Wi-Fi', 'Beige', '14"', 'Intel Core i7-13700H', 139999.0, 159999.0),
+                ('Samsung Galaxy Book3', 'NP750XFG', 'Laptop', 'Galaxy Book Series', '8GB', '256GB', 'Wi-Fi', 'Silver', '15.6"', 'Intel Core i5-1335U', 74999.0, 89999.0),
+                ('Samsung Galaxy Watch6 Classic', 'SM-R960', 'Wearable', 'Watch Series', '2GB', '16GB', 'Bluetooth/LTE', 'Black', '1.5"', 'Exynos W930', 36999.0, 44999.0),
+                ('Samsung Galaxy Watch6', 'SM-R930', 'Wearable', 'Watch Series', '2GB', '16GB', 'Bluetooth/LTE', 'Gold', '1.3"', 'Exynos W930', 29999.0, 36999.0),
+                ('Samsung Galaxy Buds3 Pro', 'SM-R630', 'Audio', 'Buds Series', None, None, 'Bluetooth', 'White', None, None, 16999.0, 19999.0),
+                ('Samsung Galaxy Buds3', 'SM-R530', 'Audio', 'Buds Series', None, None, 'Bluetooth', 'Graphite', None, None, 12999.0, 14999.0)
+            ]
+            
+            cursor.executemany('''
             INSERT INTO products (
                 product_name, product_code, product_category, product_subcategory,
                 ram, storage, connectivity, color, display_size, processor,
                 dealer_price_dp, mrp
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', product)
-        
-        # Add only 2 sample schemes as requested
-        schemes = [
-            ('Special Support - Galaxy S Series', 'Special Support', '2023-08-01', '2023-08-31', 'All India', 'All Dealers'),
-            ('Bundle Offer - Galaxy Ecosystem', 'Bundle Offer', '2023-08-01', '2023-08-31', 'All India', 'All Dealers')
-        ]
-        
-        for scheme in schemes:
-            cursor.execute('''
+            ''', products)
+            
+            # Add only 2 sample schemes as requested
+            schemes = [
+                ('Special Support - Galaxy S Series', 'Special Support', '2023-08-01', '2023-08-31', 'All India', 'All Dealers'),
+                ('Bundle Offer - Galaxy Ecosystem', 'Bundle Offer', '2023-08-01', '2023-08-31', 'All India', 'All Dealers')
+            ]
+            
+            cursor.executemany('''
             INSERT INTO schemes (
                 scheme_name, scheme_type, scheme_period_start, scheme_period_end,
                 applicable_region, dealer_type_eligibility, approval_status
             ) VALUES (?, ?, ?, ?, ?, ?, 'Approved')
-            ''', scheme)
+            ''', schemes)
             
-            scheme_id = cursor.lastrowid
+            # executemany does not report per-row ids, so read them back by name
+            cursor.execute("SELECT scheme_id, scheme_name FROM schemes")
+            scheme_ids_by_name = {row["scheme_name"]: row["scheme_id"] for row in cursor.fetchall()}
             
-            # Add scheme products
-            if 'S Series' in scheme[0]:
-                product_ids = [1, 2, 3, 4]  # S Series products
-                payout_amounts = [5000, 4000, 3000, 2500]
-                # Add free items for some products
-                free_items = ["Galaxy Buds3 Pro", "Galaxy Watch6", None, "Galaxy Buds3"]
-            else:  # Bundle Offer
-                product_ids = [1, 2, 3, 20, 22]  # Mix of products for bundle
-                payout_amounts = [3000, 2500, 2000, 1500, 1000]
-                # Add free items for some products
-                free_items = ["Galaxy Buds3 Pro", "Galaxy Watch6", None, None, "Galaxy Buds3"]
-            
-            for i, product_id in enumerate(product_ids):
-                payout_amount = payout_amounts[i] if i < len(payout_amounts) else 1000
-                free_item = free_items[i] if i < len(free_items) else None
+            scheme_product_rows = []
+            rule_rows = []
+            for scheme in schemes:
+                scheme_id = scheme_ids_by_name[scheme[0]]
+                
+                # Add scheme products
+                if 'S Series' in scheme[0]:
+                    product_ids = [1, 2, 3, 4]  # S Series products
+                    payout_amounts = [5000, 4000, 3000, 2500]
+                    # Add free items for some products
+                    free_items = ["Galaxy Buds3 Pro", "Galaxy Watch6", None, "Galaxy Buds3"]
+                else:  # Bundle Offer
+                    product_ids = [1, 2, 3, 20, 22]  # Mix of products for bundle
+                    payout_amounts = [3000, 2500, 2000, 1500, 1000]
+                    # Add free items for some products
+                    free_items = ["Galaxy Buds3 Pro", "Galaxy Watch6", None, None, "Galaxy Buds3"]
                 
-                cursor.execute('''
-                INSERT INTO scheme_products (
-                    scheme_id, product_id, support_type, payout_type,
-                    payout_amount, payout_unit, total_payout, free_item_description
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    scheme_id, product_id, scheme[1], 'Fixed',
-                    payout_amount, 'INR', payout_amount, free_item
+                for i, product_id in enumerate(product_ids):
+                    payout_amount = payout_amounts[i] if i < len(payout_amounts) else 1000
+                    free_item = free_items[i] if i < len(free_items) else None
+                    
+                    scheme_product_rows.append((
+                        scheme_id, product_id, scheme[1], 'Fixed',
+                        payout_amount, 'INR', payout_amount, free_item
+                    ))
+                
+                # Add scheme rules
+                rule_rows.append((
+                    scheme_id, 'Eligibility', f'Applicable for {scheme[5]}', scheme[5]
+                ))
+                rule_rows.append((
+                    scheme_id, 'Period', f'Valid from {scheme[2]} to {scheme[3]}', f'{scheme[2]} to {scheme[3]}'
                 ))
             
-            # Add scheme rules
-            cursor.execute('''
+            cursor.executemany('''
+            INSERT INTO scheme_products (
+                scheme_id, product_id, support_type, payout_type,
+                payout_amount, payout_unit, total_payout, free_item_description
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', scheme_product_rows)
+            
+            cursor.executemany('''
             INSERT INTO scheme_rules (
                 scheme_id, rule_type, rule_description, rule_value
             ) VALUES (?, ?, ?, ?)
-            ''', (
-                scheme_id, 'Eligibility', f'Applicable for {scheme[5]}', scheme[5]
-            ))
+            ''', rule_rows)
             
+            # Add sample sales data; dealers, products and schemes all exist by now
+            # Generate 100 random sales over the last 30 days in one statement. The
+            # draws live in the recursive CTE, which SQLite materialises row by row,
+            # so each random value is drawn once and reused (the quantity feeds both
+            # quantity_sold and the incentive). Ids are picked by joining each draw
+            # to a numbered list of dealers, schemes and products.
             cursor.execute('''
-            INSERT INTO scheme_rules (
-                scheme_id, rule_type, rule_description, rule_value
-            ) VALUES (?, ?, ?, ?)
-            ''', (
-                scheme_id, 'Period', f'Valid from {scheme[2]} to {scheme[3]}', f'{scheme[2]} to {scheme[3]}'
-            ))
-        
-        # Add sample sales data if we have dealers, products, and schemes
-        cursor.execute("SELECT dealer_id FROM dealers")
-        dealer_ids = [row[0] for row in cursor.fetchall()]
-        
-        cursor.execute("SELECT product_id FROM products")
-        product_ids = [row[0] for row in cursor.fetchall()]
-        
-        cursor.execute("SELECT scheme_id FROM schemes")
-        scheme_ids = [row[0] for row in cursor.fetchall()]
-        
-        if dealer_ids and product_ids and scheme_ids:
-            # Generate sales for the last 30 days
-            end_date = datetime.datetime.now()
-            start_date = end_date - datetime.timedelta(days=30)
+            WITH RECURSIVE draws (
+                n, dealer_draw, scheme_draw, product_draw, quantity, days_ago, status_draw
+            ) AS (
+                SELECT 1, abs(random() % 1000000), abs(random() % 1000000), abs(random() % 1000000),
+                       1 + abs(random() % 5), abs(random() % 31), abs(random() % 3)
+                UNION ALL
+                SELECT n + 1, abs(random() % 1000000), abs(random() % 1000000), abs(random() % 1000000),
+                       1 + abs(random() % 5), abs(random() % 31), abs(random() % 3)
+                FROM draws WHERE n < 100
+            ),
+            dealer_list AS (
+                SELECT dealer_id, ROW_NUMBER() OVER (ORDER BY dealer_id) - 1 AS pos, COUNT(*) OVER () AS total
+                FROM dealers
+            ),
+            scheme_list AS (
+                SELECT scheme_id, ROW_NUMBER() OVER (ORDER BY scheme_id) - 1 AS pos, COUNT(*) OVER () AS total
+                FROM schemes
+            ),
+            product_list AS (
+                SELECT product_id, dealer_price_dp, ROW_NUMBER() OVER (ORDER BY product_id) - 1 AS pos, COUNT(*) OVER () AS total
+                FROM products
+            )
+            INSERT INTO sales_transactions (
+                dealer_id, scheme_id, product_id, quantity_sold,
+                dealer_price_dp, earned_dealer_incentive_amount,
+                imei_serial, verification_status, sale_timestamp
+            )
+            SELECT
+                dealer_list.dealer_id, scheme_list.scheme_id, product_list.product_id, draws.quantity,
+                product_list.dealer_price_dp,
+                -- Scheme payout, or a default if no specific payout; answered from
+                -- the ix_sp_scheme_product covering index alone
+                COALESCE(
+                    (SELECT payout_amount FROM scheme_products
+                     WHERE scheme_id = scheme_list.scheme_id AND product_id = product_list.product_id
+                     LIMIT 1),
+                    500 + abs(random() % 2501)
+                ) * draws.quantity,
+                printf('%015d', abs(random() % 1000000000000000)),
+                CASE draws.status_draw WHEN 1 THEN 'Pending' ELSE 'Verified' END,
+                datetime('now', 'localtime', '-' || draws.days_ago || ' days')
+            FROM draws
+            JOIN dealer_list ON dealer_list.pos = draws.dealer_draw % dealer_list.total
+            JOIN scheme_list ON scheme_list.pos = draws.scheme_draw % scheme_list.total
+            JOIN product_list ON product_list.pos = draws.product_draw % product_list.total
+            ORDER BY draws.n
+            ''')
             
-            for _ in range(100):  # Generate 100 random sales
-                dealer_id = random.choice(dealer_ids)
-                product_id = random.choice(product_ids)
-                scheme_id = random.choice(scheme_ids)
-                
-                # Random date in the last 30 days
-                days_ago = random.randint(0, 30)
-                sale_date = end_date - datetime.timedelta(days=days_ago)
-                
-                # Random quantity between 1 and 5
-                quantity = random.randint(1, 5)
-                
-                # Get product price
-                cursor.execute("SELECT dealer_price_dp FROM products WHERE product_id = ?", (product_id,))
-                dealer_price = cursor.fetchone()[0]
-                
-                # Get scheme payout
-                cursor.execute("""
-                SELECT payout_amount FROM scheme_products 
-                WHERE scheme_id = ? AND product_id = ?
-                """, (scheme_id, product_id))
-                
-                payout_row = cursor.fetchone()
-                if payout_row:
-                    payout = payout_row[0]
-                else:
-                    payout = random.randint(500, 3000)  # Default if no specific payout
-                
-                # Calculate incentive
-                incentive = payout * quantity
-                
-                # Random IMEI
-                imei = ''.join([str(random.randint(0, 9)) for _ in range(15)])
-                
-                # Random verification status
-                status = random.choice(['Verified', 'Pending', 'Verified'])
-                
-                cursor.execute('''
-                INSERT INTO sales_transactions (
-                    dealer_id, scheme_id, product_id, quantity_sold,
-                    dealer_price_dp, earned_dealer_incentive_amount,
-                    imei_serial, verification_status, sale_timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    dealer_id, scheme_id, product_id, quantity,
-                    dealer_price, incentive, imei, status,
-                    sale_date.strftime('%Y-%m-%d %H:%M:%S')
-                ))
-        else:
-            print("No dealers, products, or schemes found. Cannot add sample sales data.")
+            print("Added sample data to database")
         
-        print("Added sample data to database")
-    
-    conn.commit()
-    conn.close()
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
 
-# Process a single PDF
-def process_pdf(pdf_path):
-    """Process a single PDF file and add to database"""
+# PDFs extracted at once by process_multiple_pdfs; per-page Textract calls
+# are still capped by TEXTRACT_MAX_RPS across all of them
+PDF_EXTRACT_WORKERS = 4
+
+# Parsed secrets.json keyed by path, stored as (mtime_ns, data)
+_SECRETS_CACHE = {}
+
+def read_secrets(path=SECRETS_PATH):
+    """Read secrets.json, re-parsing it only when the file changes; read and parse errors propagate"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _SECRETS_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r') as f:
+        secrets = json.load(f)
+    _SECRETS_CACHE[path] = (mtime, secrets)
+    return secrets
+
+def load_secrets():
+    """Load secrets.json, or an empty dict if it is missing or unreadable"""
+    try:
+        return read_secrets()
+    except (OSError, json.JSONDecodeError):
+        print("No secrets.json found or error reading it. Using local processing only.")
+        return {}
+
+def is_cache_fresh(cache_path, source_path):
+    """Check whether a cache file exists and was written after its source file last changed"""
+    try:
+        return os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
+    except OSError:
+        return False
+
+def save_json_atomically(path, data):
+    """Write data as JSON, replacing the file atomically so readers never see a partial file"""
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path),
+                                     suffix='.tmp', delete=False) as f:
+        json.dump(data, f)
+    os.replace(f.name, path)
+
+# Bump whenever the prompt or the model request changes so cached extractions are redone
+EXTRACTION_VERSION = 1
+
+def load_cached_extraction(path):
+    """Load structured data cached by save_cached_extraction, or None if missing or out of date"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(cached, dict) or cached.get('extraction_version') != EXTRACTION_VERSION:
+        return None
+    return cached.get('structured_data')
+
+def save_cached_extraction(path, structured_data, source):
+    """Cache structured data produced by the model; rule-based placeholders are never cached"""
+    if source != EXTRACTION_SOURCE_MODEL:
+        return
+    save_json_atomically(path, {
+        'extraction_version': EXTRACTION_VERSION,
+        'source': source,
+        'structured_data': structured_data
+    })
+
+# Extract a single PDF (text, OCR and structuring; no database work)
+def extract_scheme_from_pdf(pdf_path, bedrock_client, textract_client, inference_profile_arn, show_progress=True):
+    """Extract structured scheme data from a PDF, returning (structured_data, text_path) or None"""
     try:
         print(f"Processing {os.path.basename(pdf_path)}...")
-        
-        # Load secrets
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        secrets_path = os.path.join(current_dir, 'secrets.json')
-        
-        try:
-            with open(secrets_path, 'r') as f:
-                secrets = json.load(f)
-        except:
-            secrets = {}
-            print("No secrets.json found or error reading it. Using local processing only.")
-        
-        # Initialize AWS clients
-        bedrock_client, textract_client = initialize_aws_clients(secrets)
-        
-        # Extract text from PDF
-        pages_text = extract_text_from_pdf(pdf_path, textract_client)
-        
-        if not pages_text:
-            print(f"Failed to extract text from {os.path.basename(pdf_path)}")
-            return False
         
-        # Combine text from all pages
-        full_text = "\n\n".join([page[1] for page in pages_text])
-        
-        # Save extracted text
+        # Extracted text and structured data are cached next to each other in raw_texts
         text_dir = os.path.join(current_dir, 'raw_texts')
         os.makedirs(text_dir, exist_ok=True)
         
-        text_filename = f"{os.path.splitext(os.path.basename(pdf_path))[0]}.txt"
-        text_path = os.path.join(text_dir, text_filename)
+        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        text_path = os.path.join(text_dir, f"{base_name}.txt")
+        json_path = os.path.join(text_dir, f"{base_name}.json")
         
-        with open(text_path, 'w', encoding='utf-8') as f:
-            f.write(full_text)
+        # Both caches are newer than the PDF: skip Textract and Bedrock entirely
+        text_is_fresh = is_cache_fresh(text_path, pdf_path)
+        if text_is_fresh and is_cache_fresh(json_path, pdf_path):
+            structured_data = load_cached_extraction(json_path)
+            if structured_data:
+                return structured_data, text_path
+        
+        if text_is_fresh:
+            # Reuse the text saved by an earlier run instead of extracting it again
+            with open(text_path, 'r', encoding='utf-8') as f:
+                full_text = f.read()
+        else:
+            # Extract text from PDF
+            pages_text = extract_text_from_pdf(pdf_path, textract_client, show_progress=show_progress)
+            
+            if not pages_text:
+                print(f"Failed to extract text from {os.path.basename(pdf_path)}")
+                return None
+            
+            # Write the pages one at a time rather than joining them in memory first
+            with open(text_path, 'w', encoding='utf-8') as f:
+                for i, (_, page_text) in enumerate(pages_text):
+                    if i:
+                        f.write("\n\n")
+                    f.write(page_text)
+            
+            # Structuring needs the whole text; reading it back means the page list and
+            # the combined string are never held at the same time
+            del pages_text
+            with open(text_path, 'r', encoding='utf-8') as f:
+                full_text = f.read()
         
         # Extract structured data
-        inference_profile_arn = secrets.get('INFERENCE_PROFILE_CLAUDE')
-        structured_data = extract_structured_data_from_text(
+        structured_data, source = extract_structured_data_with_source(
             full_text,
             os.path.basename(pdf_path),
             bedrock_client,
@@ -891,155 +1267,145 @@ def process_pdf(pdf_path):
         
         if not structured_data:
             print(f"Failed to extract structured data from {os.path.basename(pdf_path)}")
-            return False
+            return None
         
-        # Add to database
-        conn = connect_db()
-        cursor = conn.cursor()
+        # Only model output is cached, so a run that fell back to the rule-based
+        # placeholders calls Bedrock again next time
+        save_cached_extraction(json_path, structured_data, source)
         
-        try:
-            # Normalize all fields to ensure correct types
-            scheme_name = normalize_field(structured_data.get('scheme_name'), str, f"Scheme from {os.path.basename(pdf_path)}")
-            scheme_type = normalize_field(structured_data.get('scheme_type'), str, 'Special Support')
-            scheme_period_start = normalize_field(structured_data.get('scheme_period_start'), str, '2023-01-01')
-            scheme_period_end = normalize_field(structured_data.get('scheme_period_end'), str, '2023-12-31')
-            applicable_region = normalize_field(structured_data.get('applicable_region'), str, 'All India')
-            dealer_type_eligibility = normalize_field(structured_data.get('dealer_type_eligibility'), str, 'All Dealers')
-            
-            # Add scheme
-            cursor.execute("""
-            INSERT INTO schemes (
-                scheme_name, scheme_type, scheme_period_start, scheme_period_end,
-                applicable_region, dealer_type_eligibility, scheme_document_name,
-                raw_extracted_text_path, deal_status, approval_status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Active', 'Pending')
-            """, (
-                scheme_name,
-                scheme_type,
-                scheme_period_start,
-                scheme_period_end,
-                applicable_region,
-                dealer_type_eligibility,
-                os.path.basename(pdf_path),
-                text_path
-            ))
-            
-            scheme_id = cursor.lastrowid
-            
-            # Add products
-            for product in structured_data.get('products', []):
-                # Normalize product fields
-                product_name = normalize_field(product.get('product_name'), str, f"Product {uuid.uuid4().hex[:8]}")
-                product_code = normalize_field(product.get('product_code'), str, f"CODE-{uuid.uuid4().hex[:8]}")
-                product_category = normalize_field(product.get('product_category'), str, 'Mobile')
-                product_subcategory = normalize_field(product.get('product_subcategory'), str, 'Other')
-                ram = normalize_field(product.get('ram'), str)
-                storage = normalize_field(product.get('storage'), str)
-                connectivity = normalize_field(product.get('connectivity'), str)
-                dealer_price_dp = normalize_field(product.get('dealer_price_dp'), float, random.randint(10000, 100000))
-                mrp = normalize_field(product.get('mrp'), float, random.randint(15000, 120000))
-                
-                # First check if product exists
-                cursor.execute("""
-                SELECT product_id FROM products 
-                WHERE product_name = ? AND product_code = ?
-                """, (product_name, product_code))
-                
-                existing = cursor.fetchone()
-                if existing:
-                    product_id = existing[0]
-                else:
-                    # Add new product
-                    cursor.execute("""
-                    INSERT INTO products (
-                        product_name, product_code, product_category, product_subcategory,
-                        ram, storage, connectivity, dealer_price_dp, mrp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        product_name,
-                        product_code,
-                        product_category,
-                        product_subcategory,
-                        ram,
-                        storage,
-                        connectivity,
-                        dealer_price_dp,
-                        mrp
-                    ))
-                    product_id = cursor.lastrowid
-                
-                # Normalize scheme product fields
-                support_type = normalize_field(product.get('support_type'), str, scheme_type)
-                payout_type = normalize_field(product.get('payout_type'), str, 'Fixed')
-                payout_amount = normalize_field(product.get('payout_amount'), float, 1000.0)
-                payout_unit = normalize_field(product.get('payout_unit'), str, 'INR')
-                dealer_contribution = normalize_field(product.get('dealer_contribution'), float, 0.0)
-                total_payout = normalize_field(product.get('total_payout'), float, payout_amount)
-                is_dealer_incentive = 1 if product.get('is_dealer_incentive', True) else 0
-                is_bundle_offer = 1 if product.get('is_bundle_offer', False) else 0
-                bundle_price = normalize_field(product.get('bundle_price'), float)
-                is_upgrade_offer = 1 if product.get('is_upgrade_offer', False) else 0
-                is_slab_based = 1 if product.get('is_slab_based', False) else 0
-                free_item_description = normalize_field(product.get('free_item_description'), str)
-                
-                # Add scheme product
-                cursor.execute("""
-                INSERT INTO scheme_products (
-                    scheme_id, product_id, support_type, payout_type, payout_amount,
-                    payout_unit, dealer_contribution, total_payout, is_dealer_incentive,
-                    is_bundle_offer, bundle_price, is_upgrade_offer, is_slab_based, free_item_description
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    scheme_id,
-                    product_id,
-                    support_type,
-                    payout_type,
-                    payout_amount,
-                    payout_unit,
-                    dealer_contribution,
-                    total_payout,
-                    is_dealer_incentive,
-                    is_bundle_offer,
-                    bundle_price,
-                    is_upgrade_offer,
-                    is_slab_based,
-                    free_item_description
-                ))
+        return structured_data, text_path
+    
+    except Exception as e:
+        print(f"Failed to process {os.path.basename(pdf_path)}: {e}")
+        return None
+
+# --- SQL Statements ---
+# Module constants so every save runs the same statement text and is served
+# from the connection's prepared-statement cache
+SQL_INSERT_SCHEME = """
+INSERT INTO schemes (
+    scheme_name, scheme_type, scheme_period_start, scheme_period_end,
+    applicable_region, dealer_type_eligibility, scheme_document_name,
+    raw_extracted_text_path, deal_status, approval_status
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Active', 'Pending')
+RETURNING scheme_id
+"""
+
+# The no-op update on conflict makes RETURNING report the existing row's id
+SQL_UPSERT_PRODUCT = """
+INSERT INTO products (
+    product_name, product_code, product_category, product_subcategory,
+    ram, storage, connectivity, dealer_price_dp, mrp
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (product_name, product_code) DO UPDATE SET product_name = excluded.product_name
+RETURNING product_id
+"""
+
+# Save extracted scheme data
+def save_scheme_to_db(conn, structured_data, pdf_path, text_path):
+    """Add an extracted scheme, its products and its rules to the database in one transaction"""
+    cursor = conn.cursor()
+    
+    try:
+        # One transaction for the scheme and all of its rows
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # Normalize all fields to ensure correct types
+        scheme_name = normalize_field(structured_data.get('scheme_name'), str, f"Scheme from {os.path.basename(pdf_path)}")
+        scheme_type = normalize_field(structured_data.get('scheme_type'), str, 'Special Support')
+        scheme_period_start = normalize_field(structured_data.get('scheme_period_start'), str, '2023-01-01')
+        scheme_period_end = normalize_field(structured_data.get('scheme_period_end'), str, '2023-12-31')
+        applicable_region = normalize_field(structured_data.get('applicable_region'), str, 'All India')
+        dealer_type_eligibility = normalize_field(structured_data.get('dealer_type_eligibility'), str, 'All Dealers')
+        
+        # Add scheme
+        cursor.execute(SQL_INSERT_SCHEME, (
+            scheme_name,
+            scheme_type,
+            scheme_period_start,
+            scheme_period_end,
+            applicable_region,
+            dealer_type_eligibility,
+            os.path.basename(pdf_path),
+            text_path
+        ))
+        
+        scheme_id = cursor.fetchone()[0]
+        
+        # Add products
+        scheme_product_rows = []
+        for product in structured_data.get('products', []):
+            # Add the product, or reuse the existing one with the same name and code
+            cursor.execute(SQL_UPSERT_PRODUCT, normalize_record(product, PRODUCT_FIELDS))
+            product_id = cursor.fetchone()[0]
             
-            # Add rules
-            for rule in structured_data.get('scheme_rules', []):
-                # Normalize rule fields
-                rule_type = normalize_field(rule.get('rule_type'), str, 'General')
-                rule_description = normalize_field(rule.get('rule_description'), str, 'No description')
-                rule_value = normalize_field(rule.get('rule_value'), str)
-                
-                cursor.execute("""
-                INSERT INTO scheme_rules (
-                    scheme_id, rule_type, rule_description, rule_value
-                ) VALUES (?, ?, ?, ?)
-                """, (
-                    scheme_id,
-                    rule_type,
-                    rule_description,
-                    rule_value
-                ))
+            # Normalize scheme product fields; payout_amount is the second schema field
+            scheme_product = normalize_record(product, SCHEME_PRODUCT_FIELDS)
+            support_type = normalize_field(product.get('support_type'), str, scheme_type)
+            total_payout = normalize_field(product.get('total_payout'), float, scheme_product[1])
+            flags = [1 if product.get(key, default) else 0 for key, default in SCHEME_PRODUCT_FLAGS]
             
-            conn.commit()
-            print(f"Added scheme from {os.path.basename(pdf_path)} to database")
-            return True
+            scheme_product_rows.append((scheme_id, product_id, support_type, total_payout, *scheme_product, *flags))
         
-        except Exception as e:
-            conn.rollback()
-            print(f"Error adding scheme: {e}")
-            return False
+        # Add scheme products
+        bulk_insert(cursor, 'scheme_products', (
+            'scheme_id', 'product_id', 'support_type', 'total_payout',
+            *(key for key, _, _ in SCHEME_PRODUCT_FIELDS),
+            *(key for key, _ in SCHEME_PRODUCT_FLAGS)
+        ), scheme_product_rows)
         
-        finally:
-            conn.close()
+        # Add rules
+        rule_rows = [
+            (scheme_id, *normalize_record(rule, RULE_FIELDS))
+            for rule in structured_data.get('scheme_rules', [])
+        ]
+        
+        bulk_insert(cursor, 'scheme_rules', ('scheme_id', *(key for key, _, _ in RULE_FIELDS)), rule_rows)
+        
+        cursor.execute("COMMIT")
+        print(f"Added scheme from {os.path.basename(pdf_path)} to database")
+        return True
     
     except Exception as e:
-        print(f"Failed to process {os.path.basename(pdf_path)}: {e}")
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        print(f"Error adding scheme: {e}")
         return False
 
+def is_document_ingested(conn, document_name):
+    """Check whether a scheme was already saved from a document with this file name"""
+    cursor = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM schemes WHERE scheme_document_name = ?)", (document_name,)
+    )
+    return bool(cursor.fetchone()[0])
+
+# Process a single PDF
+def process_pdf(pdf_path, bedrock_client=None, textract_client=None, secrets=None):
+    """Process a single PDF file and add to database"""
+    conn = connect_db()
+    try:
+        # Skip Textract and Bedrock entirely for a file that is already in the database
+        if is_document_ingested(conn, os.path.basename(pdf_path)):
+            print(f"Already ingested {os.path.basename(pdf_path)}, skipping")
+            return True
+        
+        # Callers processing many PDFs pass the secrets and clients in; build them otherwise
+        if secrets is None:
+            secrets = load_secrets()
+        if bedrock_client is None and textract_client is None:
+            bedrock_client, textract_client = initialize_aws_clients(secrets)
+        
+        extracted = extract_scheme_from_pdf(
+            pdf_path, bedrock_client, textract_client, secrets.get('INFERENCE_PROFILE_CLAUDE')
+        )
+        if not extracted:
+            return False
+        
+        structured_data, text_path = extracted
+        return save_scheme_to_db(conn, structured_data, pdf_path, text_path)
+    finally:
+        conn.close()
+
 # Process multiple PDFs
 def process_multiple_pdfs(directory):
     """Process all PDFs in a directory"""
@@ -1060,13 +1426,48 @@ def process_multiple_pdfs(directory):
     # Create tables if they don't exist
     create_tables()
     
-    # Add sample dealers
-    add_sample_data()
+    conn = connect_db()
+    try:
+        process_new_pdfs(conn, pdf_dir, pdf_files)
+    finally:
+        conn.close()
+
+def process_new_pdfs(conn, pdf_dir, pdf_files):
+    """Extract and save the PDFs in pdf_files that are not in the database yet"""
+    # Files saved by an earlier run are skipped before any Textract or Bedrock work
+    cursor = conn.execute("SELECT DISTINCT scheme_document_name FROM schemes WHERE scheme_document_name IS NOT NULL")
+    ingested = {row["scheme_document_name"] for row in cursor.fetchall()}
+    skipped = [pdf_file for pdf_file in pdf_files if pdf_file in ingested]
+    if skipped:
+        print(f"Skipping {len(skipped)} already ingested PDF(s)")
+    pdf_files = [pdf_file for pdf_file in pdf_files if pdf_file not in ingested]
+    if not pdf_files:
+        return
+    
+    # Secrets and clients are the same for every PDF, so resolve them once;
+    # boto3 clients are thread-safe and shared by the workers
+    secrets = load_secrets()
+    bedrock_client, textract_client = initialize_aws_clients(secrets)
+    extract = partial(
+        extract_scheme_from_pdf,
+        bedrock_client=bedrock_client,
+        textract_client=textract_client,
+        inference_profile_arn=secrets.get('INFERENCE_PROFILE_CLAUDE'),
+        show_progress=False
+    )
+    
+    # Extract all PDFs concurrently; the work is dominated by Textract and
+    # Bedrock round trips, which release the GIL
+    pdf_paths = [os.path.join(pdf_dir, pdf_file) for pdf_file in pdf_files]
+    with ThreadPoolExecutor(max_workers=PDF_EXTRACT_WORKERS) as executor:
+        extracted = list(executor.map(extract, pdf_paths))
     
-    # Process each PDF
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_dir, pdf_file)
-        success = process_pdf(pdf_path)
+    # Save on this thread through the caller's connection, one transaction per PDF
+    for pdf_file, pdf_path, result in zip(pdf_files, pdf_paths, extracted):
+        success = False
+        if result:
+            structured_data, text_path = result
+            success = save_scheme_to_db(conn, structured_data, pdf_path, text_path)
         
         if not success:
             print(f"Failed to process {pdf_file}")
@@ -1,8 +1,7 @@
 import os
 import json
 import sqlite3
-import shutil
-from pdf_processor_fixed import create_tables, add_sample_data
+from pdf_processor_fixed import connect_db, create_tables, add_sample_data
 
 def setup_environment():
     """Set up the environment for the DNS application"""
@@ -37,36 +36,52 @@ def setup_environment():
     
     # Check if we need to migrate the database
     if os.path.exists(db_path):
-        # Create backup of existing database
+        # connect_db also switches an older database to WAL journaling
+        conn = connect_db()
+        
+        # Create backup of existing database with SQLite's online backup API, which
+        # copies pages under a read lock; checkpointing first folds the WAL into the
+        # main file so the backup is self-contained
         backup_path = os.path.join(current_dir, 'dns_database.db.bak')
-        shutil.copy2(db_path, backup_path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        backup_conn = sqlite3.connect(backup_path)
+        try:
+            conn.backup(backup_conn)
+        finally:
+            backup_conn.close()
         print(f"Created database backup at {backup_path}")
         
         # Check if migration is needed
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         # Check if free_item_description column exists in scheme_products table
-        cursor.execute("PRAGMA table_info(scheme_products)")
-        columns = cursor.fetchall()
-        column_names = [col['name'] for col in columns]
+        has_free_item_description = any(
+            col['name'] == 'free_item_description'
+            for col in cursor.execute("PRAGMA table_info(scheme_products)")
+        )
         
-        if 'free_item_description' not in column_names:
+        if not has_free_item_description:
             print("Migrating database: Adding free_item_description column to scheme_products table")
             try:
+                cursor.execute("BEGIN IMMEDIATE")
                 cursor.execute("ALTER TABLE scheme_products ADD COLUMN free_item_description TEXT")
-                conn.commit()
+                cursor.execute("COMMIT")
                 print("Database migration successful")
             except sqlite3.Error as e:
-                print(f"Database migration error: {e}")
-                # If migration fails, use the new schema
-                conn.close()
-                os.remove(db_path)
-                print("Recreating database with updated schema")
-                create_tables()
-                add_sample_data()
-                return
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                # Another process added the column since the check; nothing to rebuild
+                if "duplicate column name" in str(e):
+                    print("Database already migrated")
+                else:
+                    print(f"Database migration error: {e}")
+                    # If migration fails, use the new schema
+                    conn.close()
+                    os.remove(db_path)
+                    print("Recreating database with updated schema")
+                    create_tables()
+                    add_sample_data()
+                    return
         
         conn.close()
     else: